@@ -0,0 +1,40 @@
+import sys
+import argparse
+from engine.batch_renderer import BatchRenderer
+
+
+# 명령행 인자 파싱
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="매니페스트 기반 콜라주 일괄 생성 (GUI 없음)")
+    parser.add_argument("manifest", help="작업 목록 JSON 파일")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="워커 프로세스 수 (기본값: CPU 코어 수)")
+    parser.add_argument("--shared-sources", action="store_true",
+                        help="소스를 한 번만 디코딩하여 공유 메모리로 워커에 전달 (메모리 절약)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    renderer = BatchRenderer(workers=args.workers, shared_sources=args.shared_sources)
+    jobs = renderer.load_manifest(args.manifest)
+
+    done = 0
+
+    # 작업 완료 시 진행 상황 출력
+    def report(result):
+        nonlocal done
+        done += 1
+        if result["error"]:
+            print(f"[{done}/{len(jobs)}] 실패 {result['output']}: {result['error']}")
+        else:
+            print(f"[{done}/{len(jobs)}] {result['output']} ({result['elapsed']:.2f}s)")
+
+    results = renderer.run(jobs, on_result=report)
+    failed = sum(1 for r in results if r["error"])
+    print(f"완료: {len(results) - failed}개 성공, {failed}개 실패")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
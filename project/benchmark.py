@@ -0,0 +1,50 @@
+import sys
+import json
+import argparse
+from engine.benchmark import CollageBenchmark, format_result
+from cli_options import parse_size, parse_option
+
+
+# 명령행 인자 파싱
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="콜라주 엔진 성능 측정 (합성 소스 이미지 사용)")
+    parser.add_argument("--canvas", type=parse_size, nargs="+", default=[(1000, 700), (3000, 2000)],
+                        help="캔버스 크기 목록 (기본값: 1000x700 3000x2000)")
+    parser.add_argument("--pieces", type=int, nargs="+", default=[20, 100],
+                        help="조각 수 목록 (기본값: 20 100)")
+    parser.add_argument("--source", type=parse_size, nargs="+", default=[(1600, 1200), (6000, 4000)],
+                        help="소스 이미지 해상도 목록 (기본값: 1600x1200 6000x4000)")
+    parser.add_argument("--repeat", type=int, default=3, help="케이스별 반복 횟수")
+    parser.add_argument("--seed", type=int, default=0, help="합성 이미지와 레시피 시드")
+    parser.add_argument("--set", type=parse_option, action="append", default=[], dest="options",
+                        metavar="KEY=VALUE", help="CollageGenerator 생성 인자 (예: --set workers=4)")
+    parser.add_argument("-o", "--output", help="결과 JSON 저장 경로")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bench = CollageBenchmark(dict(args.options), repeat=args.repeat, seed=args.seed)
+
+    # 케이스 완료 시 결과 출력
+    def report(done, total, result):
+        print(f"[{done}/{total}] {format_result(result)}", flush=True)
+
+    result = bench.run(args.canvas, args.pieces, args.source, progress=report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for (canvas, pieces, source), ratio in bench.compare(result, baseline):
+            print(f"canvas={canvas[0]}x{canvas[1]} pieces={pieces} source={source[0]}x{source[1]}: "
+                  f"기준 대비 {ratio:.2f}배")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import json
+import argparse
+
+
+# "1000x700" 형식 크기 파싱
+def parse_size(text):
+    try:
+        w, h = text.lower().split("x")
+        return int(w), int(h)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"크기 형식이 잘못되었습니다 (예: 1000x700): {text}")
+
+
+# "key=value" 형식 생성기 옵션 파싱 (값은 JSON, 실패하면 문자열)
+def parse_option(text):
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"옵션 형식이 잘못되었습니다 (예: workers=4): {text}")
+    key, value = text.split("=", 1)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
@@ -0,0 +1,220 @@
+import os
+import math
+import random
+import cv2
+from engine.layout_manager import LayoutManager
+from engine.compositor import TiledCompositor
+
+# 레시피를 애니메이션으로 렌더링하는 클래스 (조각 등장/이동/회전)
+# 조각별 변환 결과를 캐시하고, 프레임 사이에 바뀐 조각이 덮는 사각형만 다시 합성
+class CollageAnimator:
+
+    VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+    # generator: CollageGenerator (조각 준비/변환/합성에 사용)
+    # motions: "appear"(순서대로 등장), "drift"(이동), "rotate"(회전) 중 사용할 움직임
+    # drift: 전체 클립 동안 최대 이동 거리 (캔버스 짧은 변 대비), spin: 전체 클립 동안 최대 회전 각도
+    # appear_ratio: 모든 조각이 나타나는 시점 (전체 프레임 대비), angle_step: 각도 양자화 단위
+    def __init__(self, generator, motions=("appear",), drift=0.1, spin=30, appear_ratio=0.7, angle_step=0.25):
+        for motion in motions:
+            if motion not in ("appear", "drift", "rotate"):
+                raise ValueError(f"알 수 없는 움직임: {motion}")
+        self.generator = generator
+        self.motions = tuple(motions)
+        self.drift = drift
+        self.spin = spin
+        self.appear_ratio = appear_ratio
+        self.angle_step = angle_step
+
+    # 애니메이션 저장 (동영상 확장자면 VideoWriter, 아니면 폴더에 프레임 이미지)
+    def save(self, recipe, output, frames=120, fps=30, scale=1.0, progress=None, cancel_event=None):
+        if output.lower().endswith(self.VIDEO_EXTENSIONS):
+            self.write_video(recipe, output, frames, fps, scale, progress=progress, cancel_event=cancel_event)
+        else:
+            self.write_frames(recipe, output, frames, scale, progress=progress, cancel_event=cancel_event)
+
+    # cv2.VideoWriter로 동영상 저장 (fourcc: 코덱 4글자)
+    def write_video(self, recipe, path, frames=120, fps=30, scale=1.0, fourcc="mp4v",
+                    progress=None, cancel_event=None):
+        canvas_size, _, _ = self.generator._scaled_sizes(recipe, scale)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, canvas_size)
+        if not writer.isOpened():
+            raise IOError(f"동영상 파일을 열 수 없습니다: {path}")
+
+        try:
+            for frame in self.frames(recipe, frames, scale, progress, cancel_event):
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR))
+        finally:
+            writer.release()
+
+    # 폴더에 프레임 이미지 저장 (pattern: 프레임 번호가 들어갈 파일 이름)
+    def write_frames(self, recipe, out_dir, frames=120, scale=1.0, pattern="frame_{:05d}.png",
+                     progress=None, cancel_event=None):
+        os.makedirs(out_dir, exist_ok=True)
+        for i, frame in enumerate(self.frames(recipe, frames, scale, progress, cancel_event)):
+            self.generator.image_manager.save(os.path.join(out_dir, pattern.format(i)), frame)
+
+    # 프레임을 순서대로 생성 (최종 크기 BGRA 뷰, 다음 프레임에서 덮어쓰므로 보관하려면 복사)
+    # progress(완료 수, 전체 수)는 프레임마다 호출, cancel_event가 설정되면 GenerationCancelled 발생
+    def frames(self, recipe, frames=120, scale=1.0, progress=None, cancel_event=None):
+        generator = self.generator
+        canvas_size, margin, work_size = generator._scaled_sizes(recipe, scale)
+        cw, ch = canvas_size
+
+        canvas = generator._create_canvas(canvas_size, margin)
+        layout_manager = LayoutManager(canvas_size=work_size)
+        source_images = generator._source_pool(recipe["image_paths"], work_size)
+
+        # 메인 이미지는 움직이지 않으므로 한 번만 준비 (배치 기록기로 최종 좌표 계산)
+        recorder = TiledCompositor(generator.placer)
+        main_image = generator._prepare_main_image(source_images[0], layout_manager.main_area, recipe["main"])
+        generator._place_main_image(canvas, main_image, layout_manager.main_area, recorder)
+        main_layer = recorder.placements[0]
+
+        pieces = recipe["pieces"]
+        tracks = self._plan_tracks(recipe, work_size, frames)
+
+        # 조각별 캐시: 현재 상태 키, 현재 패치 (patch, x, y), 움직이는 조각의 마스크
+        # 크롭 뷰는 소스 전체를 붙잡으므로 보관하지 않고 다시 변환할 때마다 소스 풀에서 준비
+        moving = "drift" in self.motions or "rotate" in self.motions
+        states = [None] * len(pieces)
+        patches = [None] * len(pieces)
+        masks = [None] * len(pieces)
+
+        visible = (margin, margin, margin + cw, margin + ch)
+        for f in range(frames):
+            generator._check_cancel(cancel_event)
+            dirty = []
+
+            for i, piece in enumerate(pieces):
+                state = self._piece_state(tracks[i], f)
+                if state == states[i]:
+                    continue
+
+                # 이전 위치는 지워야 하므로 더티 영역에 추가
+                if patches[i] is not None:
+                    dirty.append(self._patch_rect(patches[i]))
+                states[i] = state
+                patches[i] = None
+                if state is None:
+                    continue
+
+                layer = generator._piece_layer(source_images[piece["source"]], piece, work_size, mask=masks[i])
+                if moving:
+                    masks[i] = layer["mask"]
+                angle, px, py = state
+                patch, x, y, offset = generator._warp_layer(layer, angle, (px, py), work_size)
+                if patch is None:
+                    continue
+                if offset is not None:
+                    x += offset[0]
+                    y += offset[1]
+                patches[i] = (patch, x, y)
+                dirty.append(self._patch_rect(patches[i]))
+
+            # 첫 프레임은 전체 합성
+            if f == 0:
+                dirty = [visible]
+
+            for rect in self._merge_rects(dirty, visible):
+                self._recomposite(canvas, rect, patches, main_layer)
+
+            yield generator._crop_to_final_size(canvas, canvas_size, margin)
+            if progress is not None:
+                progress(f + 1, frames)
+
+    # 조각별 움직임 결정 (레시피 시드로 고정, 같은 레시피면 같은 애니메이션)
+    # 반환값: 조각마다 {"size", "angle", "center", "velocity", "spin", "appear"}
+    def _plan_tracks(self, recipe, work_size, frames):
+        work_w, work_h = work_size
+        rng = random.Random(recipe.get("seed"))
+        pieces = recipe["pieces"]
+        distance = self.drift * min(work_w, work_h) / max(1, frames - 1)
+        spin = self.spin / max(1, frames - 1)
+
+        tracks = []
+        for i, piece in enumerate(pieces):
+            pw = max(1, int(round(piece["size"][0] * work_w)))
+            ph = max(1, int(round(piece["size"][1] * work_h)))
+            px = int(round(piece["position"][0] * work_w))
+            py = int(round(piece["position"][1] * work_h))
+
+            # 회전된 전체 사각형 중심 (움직임은 중심 기준)
+            _, full_w, full_h = self.generator.image_manager.rotation_matrix(pw, ph, piece["angle"])
+
+            # 움직임 종류와 관계없이 같은 순서로 뽑아서 조합을 바꿔도 궤적 유지
+            direction = rng.uniform(0, 2 * math.pi)
+            speed = distance * rng.uniform(0.5, 1.0)
+            piece_spin = spin * rng.uniform(-1.0, 1.0)
+
+            tracks.append({
+                "size": (pw, ph),
+                "angle": piece["angle"],
+                "center": (px + full_w / 2, py + full_h / 2),
+                "velocity": ((math.cos(direction) * speed, math.sin(direction) * speed)
+                             if "drift" in self.motions else (0.0, 0.0)),
+                "spin": piece_spin if "rotate" in self.motions else 0.0,
+                "appear": (int(i * self.appear_ratio * frames / len(pieces))
+                           if "appear" in self.motions else 0)
+            })
+        return tracks
+
+    # 프레임 f에서 조각 상태 (angle, px, py), 아직 안 나타났으면 None
+    def _piece_state(self, track, f):
+        if f < track["appear"]:
+            return None
+
+        angle = track["angle"] + track["spin"] * f
+        angle = round(angle / self.angle_step) * self.angle_step
+
+        # 각도가 바뀌면 회전된 전체 크기도 바뀌므로 중심을 유지하도록 좌상단 계산
+        pw, ph = track["size"]
+        _, full_w, full_h = self.generator.image_manager.rotation_matrix(pw, ph, angle)
+        cx = track["center"][0] + track["velocity"][0] * f
+        cy = track["center"][1] + track["velocity"][1] * f
+        return angle, int(round(cx - full_w / 2)), int(round(cy - full_h / 2))
+
+    # 패치가 덮는 사각형 (x1, y1, x2, y2)
+    def _patch_rect(self, placed):
+        patch, x, y = placed
+        return x, y, x + patch.shape[1], y + patch.shape[0]
+
+    # 보이는 영역으로 자르고 겹치는 사각형끼리 합치기
+    def _merge_rects(self, rects, bounds):
+        bx1, by1, bx2, by2 = bounds
+        merged = []
+        for x1, y1, x2, y2 in rects:
+            rect = (max(bx1, x1), max(by1, y1), min(bx2, x2), min(by2, y2))
+            if rect[2] <= rect[0] or rect[3] <= rect[1]:
+                continue
+
+            # 합친 사각형이 다른 사각형과 새로 겹칠 수 있으므로 더 이상 겹치지 않을 때까지 반복
+            changed = True
+            while changed:
+                changed = False
+                for other in merged:
+                    if (rect[0] < other[2] and other[0] < rect[2] and
+                            rect[1] < other[3] and other[1] < rect[3]):
+                        merged.remove(other)
+                        rect = (min(rect[0], other[0]), min(rect[1], other[1]),
+                                max(rect[2], other[2]), max(rect[3], other[3]))
+                        changed = True
+                        break
+            merged.append(rect)
+        return merged
+
+    # 사각형 영역을 배경부터 다시 합성 (조각 z-order 순서, 메인 이미지가 맨 위)
+    def _recomposite(self, canvas, rect, patches, main_layer):
+        x1, y1, x2, y2 = rect
+        view = canvas[y1:y2, x1:x2]
+        view[:] = 255
+
+        for placed in patches:
+            if placed is None:
+                continue
+            patch, x, y = placed
+            if x < x2 and x + patch.shape[1] > x1 and y < y2 and y + patch.shape[0] > y1:
+                self.generator.placer.alpha_blend(view, patch, x - x1, y - y1, opaque_canvas=True)
+
+        patch, x, y = main_layer
+        self.generator.placer.alpha_blend(view, patch, x - x1, y - y1, opaque_canvas=True)
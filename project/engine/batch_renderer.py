@@ -0,0 +1,220 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from engine.collage_generator import CollageGenerator
+from engine.telemetry import RenderStats
+from engine.shared_sources import SharedSourceStore, SharedSourceViews, source_key
+
+# 워커 프로세스마다 하나씩 유지하는 생성기와 공유 메모리 소스 뷰
+_worker_generator = None
+_worker_views = None
+
+
+# 워커 프로세스 초기화
+def _init_worker():
+    global _worker_generator
+    _worker_generator = CollageGenerator()
+
+
+# 작업 하나를 렌더링하고 결과 파일로 저장 (워커에서 실행)
+def _render_job(job):
+    if _worker_generator is None:
+        _init_worker()
+
+    start = time.perf_counter()
+    stats = job.get("stats") or (RenderStats() if job.get("stats_output") else None)
+    try:
+        if job.get("shared_sources") is not None:
+            _use_shared_sources(job["shared_sources"])
+
+        # 부모가 만든 레시피나 저장된 레시피가 있으면 그대로 렌더링, 없으면 새 레시피 생성
+        if job.get("recipe_data"):
+            recipe = job["recipe_data"]
+        elif job.get("recipe"):
+            with open(job["recipe"], encoding="utf-8") as f:
+                recipe = json.load(f)
+        else:
+            recipe = _worker_generator.create_recipe(
+                image_paths=job["image_paths"],
+                canvas_size=tuple(job["canvas_size"]),
+                pieces=job["pieces"],
+                seed=job.get("seed"),
+                stats=stats
+            )
+
+        result = _worker_generator.render_recipe(recipe, job["scale"], stats=stats)
+
+        _ensure_parent_dir(job["output"])
+        _worker_generator.image_manager.save(job["output"], result)
+
+        if job.get("recipe_output"):
+            _ensure_parent_dir(job["recipe_output"])
+            with open(job["recipe_output"], "w", encoding="utf-8") as f:
+                json.dump(recipe, f)
+
+        if stats is not None:
+            _ensure_parent_dir(job["stats_output"])
+            stats.to_json(job["stats_output"])
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        "index": job["index"],
+        "output": job["output"],
+        "elapsed": time.perf_counter() - start,
+        "error": error
+    }
+
+
+# 부모가 공유 메모리에 올린 소스를 생성기의 ImageManager에 연결 (이전 작업에서 쓰던 것은 가능하면 닫음)
+def _use_shared_sources(descriptors):
+    global _worker_views
+    if _worker_views is None:
+        _worker_views = SharedSourceViews()
+
+    image_manager = _worker_generator.image_manager
+    image_manager.shared_images = {}
+    _worker_views.detach_unused(descriptors)
+    image_manager.shared_images = _worker_views.attach(descriptors)
+
+
+# 출력 파일의 상위 폴더 생성
+def _ensure_parent_dir(path):
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+
+# 매니페스트 기반 일괄 콜라주 렌더링 클래스
+class BatchRenderer:
+
+    # shared_sources=True이면 소스를 부모에서 한 번만 디코딩하여 공유 메모리로 워커에 전달 (워커 2개 이상일 때)
+    def __init__(self, workers=None, shared_sources=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_sources = shared_sources
+
+        # 작업 항목 기본값 (CollageGenerator.generate 기본값과 동일)
+        self.default_canvas_size = (1000, 700)
+        self.default_pieces = 20
+
+    # 매니페스트(JSON) 읽기
+    # 형식: {"defaults": {...}, "jobs": [{...}, ...]} 또는 작업 리스트
+    def load_manifest(self, path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if isinstance(manifest, list):
+            manifest = {"jobs": manifest}
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+        defaults = manifest.get("defaults", {})
+        return [self._normalize_job(dict(defaults, **job), i, base_dir)
+                for i, job in enumerate(manifest.get("jobs", []))]
+
+    # 작업 항목 검증 및 기본값 채우기 (상대 경로는 매니페스트 위치 기준)
+    # recipe: 저장된 레시피로 렌더링 (image_paths 대신), scale: 렌더링 배율
+    # recipe_output: 사용한 레시피를 JSON으로 저장할 경로, stats_output: 단계별 계측(RenderStats) JSON 경로
+    def _normalize_job(self, job, index, base_dir):
+        if not job.get("image_paths") and not job.get("recipe"):
+            raise ValueError(f"작업 {index}: image_paths 또는 recipe가 필요합니다.")
+        if not job.get("output"):
+            raise ValueError(f"작업 {index}: output이 없습니다.")
+
+        def resolve(p):
+            return p if os.path.isabs(p) else os.path.join(base_dir, p)
+
+        return {
+            "index": index,
+            "image_paths": [resolve(p) for p in job.get("image_paths", [])],
+            "canvas_size": tuple(job.get("canvas_size", self.default_canvas_size)),
+            "pieces": max(1, int(job.get("pieces", self.default_pieces))),
+            "seed": job.get("seed"),
+            "scale": float(job.get("scale", 1.0)),
+            "recipe": resolve(job["recipe"]) if job.get("recipe") else None,
+            "recipe_output": resolve(job["recipe_output"]) if job.get("recipe_output") else None,
+            "stats_output": resolve(job["stats_output"]) if job.get("stats_output") else None,
+            "output": resolve(job["output"])
+        }
+
+    # 작업들을 프로세스 풀에서 렌더링, 끝나는 순서대로 on_result 호출
+    def run(self, jobs, on_result=None):
+        results = []
+
+        # 워커 1개면 현재 프로세스에서 순차 실행
+        if self.workers <= 1:
+            for job in jobs:
+                self._collect(_render_job(job), results, on_result)
+            return results
+
+        if self.shared_sources:
+            return self._run_shared(jobs, results, on_result)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_render_job, job) for job in jobs]
+            for future in as_completed(futures):
+                self._collect(future.result(), results, on_result)
+
+        return results
+
+    # 공유 메모리 소스로 실행: 작업을 넣을 때 필요한 소스를 올리고(참조 +1), 끝나면 참조 -1
+    # 동시에 넣어 두는 작업은 워커 수의 2배까지이므로, 공유 메모리에는 그 작업들이 쓰는 소스만 올라가 있음
+    def _run_shared(self, jobs, results, on_result):
+        # 레시피는 부모에서 생성 (크기는 헤더로, 메인 이미지만 디코딩), 캐시는 공유 저장소가 같이 사용
+        planner = CollageGenerator(pool_max_images=1, pool_max_bytes=64 * 1024 * 1024)
+        max_in_flight = self.workers * 2
+
+        with SharedSourceStore(planner.image_manager) as store:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                pending = iter(jobs)
+                futures = {}
+
+                # 동시 작업 수가 상한에 닿을 때까지 다음 작업을 준비해서 넣기
+                def submit_more():
+                    while len(futures) < max_in_flight:
+                        job = next(pending, None)
+                        if job is None:
+                            return
+                        start = time.perf_counter()
+                        try:
+                            shared_job, keys = self._prepare_shared_job(job, planner)
+                            shared_job["shared_sources"] = store.acquire(keys)
+                        except Exception as e:
+                            self._collect({"index": job["index"], "output": job["output"],
+                                           "elapsed": time.perf_counter() - start,
+                                           "error": f"{type(e).__name__}: {e}"}, results, on_result)
+                            continue
+                        futures[pool.submit(_render_job, shared_job)] = keys
+
+                submit_more()
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        store.release(futures.pop(future))
+                        self._collect(future.result(), results, on_result)
+                    submit_more()
+
+        return results
+
+    # 공유 메모리 작업 준비: 레시피를 확정하고 렌더링에 실제로 쓰는 (경로, 목표 크기) 키 목록 계산
+    # 키는 메인 이미지와 조각이 쓰는 소스만 (폴더 전체를 지정해도 쓰는 것만 디코딩)
+    def _prepare_shared_job(self, job, planner):
+        stats = RenderStats() if job.get("stats_output") else None
+        if job["recipe"]:
+            with open(job["recipe"], encoding="utf-8") as f:
+                recipe = json.load(f)
+        else:
+            recipe = planner.create_recipe(job["image_paths"], tuple(job["canvas_size"]), job["pieces"],
+                                           job.get("seed"), stats)
+
+        _, _, work_size = planner._scaled_sizes(recipe, job["scale"])
+        used = sorted({0} | {piece["source"] for piece in recipe["pieces"]})
+        keys = [source_key(recipe["image_paths"][i], work_size) for i in used]
+        return dict(job, recipe_data=recipe, stats=stats), keys
+
+    # 완료된 결과 기록
+    def _collect(self, result, results, on_result):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
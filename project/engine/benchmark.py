@@ -0,0 +1,192 @@
+import os
+import time
+import random
+import platform
+import tempfile
+import tracemalloc
+import numpy as np, cv2
+from engine.collage_generator import CollageGenerator
+
+# 합성 소스 이미지로 콜라주 엔진 성능을 측정하는 클래스
+class CollageBenchmark:
+
+    # generator_options: CollageGenerator 생성 인자 (최적화 옵션 비교용)
+    # repeat: 측정 반복 횟수 (최솟값과 중앙값 기록), seed: 합성 이미지와 레시피 시드
+    def __init__(self, generator_options=None, repeat=3, seed=0, sources=4):
+        self.generator_options = dict(generator_options or {})
+        self.repeat = max(1, repeat)
+        self.seed = seed
+        self.sources = max(1, sources)
+
+    # 캔버스 크기 x 조각 수 x 소스 해상도 조합을 모두 측정
+    # progress(완료 수, 전체 수, 현재 케이스)는 케이스마다 호출
+    def run(self, canvas_sizes, piece_counts, source_sizes, progress=None):
+        cases = [(tuple(c), p, tuple(s)) for s in source_sizes for c in canvas_sizes for p in piece_counts]
+        results = []
+
+        with tempfile.TemporaryDirectory(prefix="collage_bench_") as temp_dir:
+            paths_by_size = {}
+            for i, (canvas_size, pieces, source_size) in enumerate(cases):
+                if source_size not in paths_by_size:
+                    paths_by_size[source_size] = self.write_sources(temp_dir, source_size)
+
+                results.append(self.run_case(paths_by_size[source_size], canvas_size, pieces, source_size))
+                if progress is not None:
+                    progress(i + 1, len(cases), results[-1])
+
+        return {
+            "environment": self.environment(),
+            "generator_options": self.generator_options,
+            "repeat": self.repeat,
+            "seed": self.seed,
+            "results": results
+        }
+
+    # 실행 환경 정보 (결과 비교 시 확인용)
+    def environment(self):
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count()
+        }
+
+    # 합성 소스 이미지 파일 생성 (부드러운 그라디언트 + 노이즈, JPEG)
+    def write_sources(self, temp_dir, source_size):
+        w, h = source_size
+        rng = np.random.default_rng(self.seed)
+        paths = []
+
+        for i in range(self.sources):
+            # 저해상도 랜덤 색을 키워서 사진처럼 완만한 영역을 만든 뒤 노이즈 추가
+            base = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+            img = cv2.resize(base, (w, h), interpolation=cv2.INTER_CUBIC)
+            noise = rng.integers(-12, 13, (h, w, 3), dtype=np.int16)
+            img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+            path = os.path.join(temp_dir, f"source_{w}x{h}_{i}.jpg")
+            if not cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 90]):
+                raise IOError(f"합성 이미지를 저장할 수 없습니다: {path}")
+            paths.append(path)
+
+        return paths
+
+    # 케이스 하나 측정: generate() 전체 + 단계별 시간 + 최대 메모리
+    def run_case(self, image_paths, canvas_size, pieces, source_size):
+        generator = CollageGenerator(**self.generator_options)
+
+        # 첫 실행은 디코드 캐시와 마스크 뱅크 준비용 (측정 제외)
+        generator.generate(image_paths, canvas_size, pieces, seed=self.seed)
+
+        times = []
+        for i in range(self.repeat):
+            start = time.perf_counter()
+            generator.generate(image_paths, canvas_size, pieces, seed=self.seed + i)
+            times.append(time.perf_counter() - start)
+
+        best = min(times)
+        megapixels = canvas_size[0] * canvas_size[1] / 1e6
+
+        return {
+            "canvas_size": list(canvas_size),
+            "pieces": pieces,
+            "source_size": list(source_size),
+            "generate": {
+                "min_s": best,
+                "median_s": float(np.median(times)),
+                "pieces_per_s": pieces / best,
+                "megapixels_per_s": megapixels / best,
+                "peak_bytes": self._peak_memory(generator, image_paths, canvas_size, pieces)
+            },
+            "stages": self._time_stages(generator, image_paths, canvas_size, pieces)
+        }
+
+    # generate() 한 번의 최대 파이썬/numpy 할당량 (tracemalloc 기준, OpenCV 내부 버퍼는 제외)
+    def _peak_memory(self, generator, image_paths, canvas_size, pieces):
+        tracemalloc.start()
+        try:
+            generator.generate(image_paths, canvas_size, pieces, seed=self.seed)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    # 레시피의 조각들로 단계별 시간 측정
+    # piece: 조각 하나 렌더링 전체 (크롭/변환/합성), mask: 마스크 생성, rotate: 회전, alpha_blend: 합성
+    def _time_stages(self, generator, image_paths, canvas_size, pieces):
+        recipe = generator.create_recipe(image_paths, canvas_size, pieces, seed=self.seed)
+        work_size = generator._work_size(canvas_size)
+        work_w, work_h = work_size
+        layout_manager = generator._setup_layout(canvas_size)
+        polygon_config = layout_manager.get_polygon_config()
+        source_images = generator.image_manager.load_multiple(image_paths, target_size=work_size)
+        rng = random.Random(self.seed)
+
+        stages = {name: {"calls": 0, "seconds": 0.0, "pixels": 0}
+                  for name in ("piece", "mask", "rotate", "alpha_blend")}
+
+        def record(name, start, pixels):
+            stage = stages[name]
+            stage["calls"] += 1
+            stage["seconds"] += time.perf_counter() - start
+            stage["pixels"] += pixels
+
+        canvas = generator._create_canvas(canvas_size)
+        for piece in recipe["pieces"]:
+            pw = max(1, int(round(piece["size"][0] * work_w)))
+            ph = max(1, int(round(piece["size"][1] * work_h)))
+            px = int(round(piece["position"][0] * work_w))
+            py = int(round(piece["position"][1] * work_h))
+            src = source_images[piece["source"]]
+
+            start = time.perf_counter()
+            generator._render_piece(canvas, src, piece, work_size)
+            record("piece", start, pw * ph)
+
+            start = time.perf_counter()
+            mask = generator.masker.create_piece_mask(pw, ph, polygon_config, rng)
+            record("mask", start, pw * ph)
+
+            # 회전과 합성은 소스에서 자른 조각 크기 패치로 측정
+            patch = generator.image_manager.resize_and_crop_random(src, pw, ph, rng)
+            patch[:, :, 3] = mask
+
+            start = time.perf_counter()
+            rotated, offset = generator.image_manager.rotate(patch, piece["angle"], trim=True)
+            record("rotate", start, pw * ph)
+
+            start = time.perf_counter()
+            generator.placer.alpha_blend(canvas, rotated, px, py, opaque_canvas=True, offset=offset)
+            record("alpha_blend", start, rotated.shape[0] * rotated.shape[1])
+
+        for stage in stages.values():
+            calls, seconds = stage["calls"], stage["seconds"]
+            stage["ms_per_call"] = seconds * 1000 / calls if calls else 0.0
+            stage["megapixels_per_s"] = stage["pixels"] / 1e6 / seconds if seconds > 0 else 0.0
+
+        return stages
+
+    # 이전 결과(JSON dict)와 비교하여 케이스별 generate() 속도 비율 목록 반환 (> 1이면 빨라짐)
+    def compare(self, report, baseline):
+        def key(r):
+            return (tuple(r["canvas_size"]), r["pieces"], tuple(r["source_size"]))
+
+        previous = {key(r): r for r in baseline.get("results", [])}
+        rows = []
+        for r in report["results"]:
+            old = previous.get(key(r))
+            if old is not None:
+                rows.append((key(r), old["generate"]["min_s"] / r["generate"]["min_s"]))
+        return rows
+
+
+# 사람이 읽을 수 있는 결과 한 줄 (CLI 출력용)
+def format_result(result):
+    gen = result["generate"]
+    stages = " ".join(f"{name}={s['ms_per_call']:.2f}ms" for name, s in result["stages"].items())
+    cw, ch = result["canvas_size"]
+    sw, sh = result["source_size"]
+    return (f"canvas={cw}x{ch} pieces={result['pieces']} source={sw}x{sh}: "
+            f"{gen['min_s']:.3f}s {gen['pieces_per_s']:.1f} pieces/s {gen['megapixels_per_s']:.2f} MP/s "
+            f"peak={gen['peak_bytes'] / 2 ** 20:.1f}MiB | {stages}")
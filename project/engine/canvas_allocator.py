@@ -0,0 +1,34 @@
+import tempfile
+import numpy as np
+
+# 작업 캔버스 버퍼 할당 클래스 (메모리 배열 또는 파일 기반 memmap)
+class CanvasAllocator:
+
+    # backend: "memory", "memmap", "auto" (memmap_threshold 바이트를 넘으면 memmap)
+    # temp_dir: memmap 임시 파일 위치 (None이면 시스템 임시 폴더)
+    def __init__(self, backend="auto", memmap_threshold=512 * 1024 * 1024, temp_dir=None):
+        if backend not in ("memory", "memmap", "auto"):
+            raise ValueError(f"알 수 없는 캔버스 백엔드: {backend}")
+        self.backend = backend
+        self.memmap_threshold = memmap_threshold
+        self.temp_dir = temp_dir
+
+        # memmap 초기화 시 한 번에 채우는 행 수
+        self.fill_rows = 256
+
+    # (h, w, channels) 크기 uint8 캔버스를 fill 값으로 채워서 반환
+    def allocate(self, width, height, channels=4, fill=255):
+        shape = (height, width, channels)
+        nbytes = width * height * channels
+
+        if self.backend == "memory" or (self.backend == "auto" and nbytes <= self.memmap_threshold):
+            return np.full(shape, fill, dtype=np.uint8)
+
+        # 이름 없는 임시 파일에 매핑 (프로세스 종료 또는 배열 해제 시 자동 삭제)
+        with tempfile.TemporaryFile(dir=self.temp_dir) as f:
+            canvas = np.memmap(f, dtype=np.uint8, mode="w+", shape=shape)
+
+        # 행 단위로 채워서 전체 크기의 임시 배열을 만들지 않음
+        for y in range(0, height, self.fill_rows):
+            canvas[y:y + self.fill_rows] = fill
+        return canvas
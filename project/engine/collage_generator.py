@@ -1,69 +1,255 @@
+import os
+import math
 import numpy as np
 import random
+import cv2
 from engine.layout_manager import LayoutManager
 from engine.mask_generator import MaskGenerator
 from engine.placer import Placer
 from engine.image_manager import ImageManager
+from engine.compositor import TiledCompositor
+from engine.canvas_allocator import CanvasAllocator
+from engine.source_pool import SourcePool
+from engine.occupancy_grid import OccupancyGrid
+from engine.telemetry import NULL_STATS
+from engine.animator import CollageAnimator
+
+# 생성 도중 취소되었을 때 발생하는 예외
+class GenerationCancelled(Exception):
+    pass
+
 
 # 디지털 콜라주 생성 클래스
 class CollageGenerator:
-    
-    def __init__(self):
-        self.image_manager = ImageManager()
-        self.masker = MaskGenerator()
+
+    # 레시피 형식 버전
+    RECIPE_VERSION = 1
+
+    # workers > 1이면 배치를 기록한 뒤 타일 단위로 병렬 합성
+    # trim_patches=True이면 회전된 조각을 알파 영역만 잘라서 합성
+    # fused_pieces=True이면 조각을 원본에서 캔버스 좌표로 한 번에 변환 (크롭/회전 중간 배열 없음)
+    # mask_bank_size > 0이면 조각 다각형 마스크를 미리 만든 뱅크에서 재사용
+    # canvas_backend: "memory", "memmap", "auto" (큰 캔버스는 파일 기반 memmap 사용)
+    # canvas_temp_dir: memmap 캔버스 임시 파일 위치 (None이면 시스템 임시 폴더, tmpfs면 메모리를 쓰므로 디스크 경로 지정)
+    # placement: "random" (랜덤 탐색) 또는 "grid" (덮임 격자로 빈 곳 우선 배치)
+    # front_to_back=True이면 배치를 모두 기록한 뒤 위에서부터 합성하여 가려진 부분 생략 (workers와 무관)
+    # pool_max_images / pool_max_bytes: 소스 이미지를 사용할 때 디코딩하며 동시에 붙잡아 두는 상한
+    # (디코딩 캐시도 같은 바이트 예산을 쓰며, 풀과 캐시는 같은 배열을 공유하므로 중복 보관하지 않음)
+    # source_pyramids=True이면 크게 축소되는 조각/메인 이미지를 소스의 축소 피라미드에서 읽음
+    def __init__(self, workers=1, tile_size=512, trim_patches=True, fused_pieces=True,
+                 mask_bank_size=0, canvas_backend="auto", placement="random", front_to_back=False,
+                 pool_max_images=32, pool_max_bytes=256 * 1024 * 1024, source_pyramids=True,
+                 canvas_temp_dir=None):
+        if placement not in ("random", "grid"):
+            raise ValueError(f"알 수 없는 배치 방식: {placement}")
+
+        self.image_manager = ImageManager(cache_bytes=pool_max_bytes, use_pyramids=source_pyramids)
+        self.masker = MaskGenerator(bank_size=mask_bank_size)
         self.placer = Placer()
+        self.canvas_allocator = CanvasAllocator(canvas_backend, temp_dir=canvas_temp_dir)
         self.canvas_margin = 100
+        self.workers = workers
+        self.tile_size = tile_size
+        self.trim_patches = trim_patches
+        self.fused_pieces = fused_pieces
+        self.placement = placement
+        self.front_to_back = front_to_back
+        self.pool_max_images = pool_max_images
+        self.pool_max_bytes = pool_max_bytes
+
+        # 격자 셀 크기: 최소 grid_cell_size, 큰 캔버스는 짧은 변이 grid_short_side_cells칸 정도가 되도록 확대
+        self.grid_cell_size = 16
+        self.grid_short_side_cells = 128
 
     # 콜라주 생성
-    def generate(self, image_paths, canvas_size=(1000, 700), pieces=20):
+    # progress(완료 수, 전체 수): 조각/메인 이미지 배치마다 호출 (전체 수 = pieces + 1)
+    # cancel_event(threading.Event)가 설정되면 조각 사이에서 GenerationCancelled 발생
+    # seed가 없으면 전역 random에서 뽑으며, return_recipe=True이면 (결과, 레시피) 반환
+    # stats(RenderStats)를 넘기면 단계별/조각별 시간, 할당 크기, 합성 면적을 기록
+    def generate(self, image_paths, canvas_size=(1000, 700), pieces=20,
+                 progress=None, cancel_event=None, seed=None, return_recipe=False, stats=None):
+        # 1. 모든 랜덤 결정을 레시피로 기록
+        recipe = self.create_recipe(image_paths, canvas_size, pieces, seed, stats)
+
+        # 2. 레시피를 원래 크기로 렌더링
+        final = self.render_recipe(recipe, 1.0, progress, cancel_event, stats)
+
+        if return_recipe:
+            return final, recipe
+        return final
+
+    # 레시피 생성: 소스 선택, 크롭, 다각형, 각도, 위치를 정규화 좌표로 기록 (JSON 직렬화 가능)
+    # 크롭은 소스 크기 대비, 조각 크기와 위치는 작업 캔버스 크기 대비 비율
+    def create_recipe(self, image_paths, canvas_size=(1000, 700), pieces=20, seed=None, stats=None):
+        stats = stats or NULL_STATS
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        rng = random.Random(seed)
+
+        # 1. 레이아웃 설정
+        work_size = self._work_size(canvas_size)
+        layout_manager = self._setup_layout(canvas_size)
+
+        # 2. 소스 풀 준비 (계획에는 크기만 필요하므로 헤더로 크기를 알 수 있으면 디코딩하지 않음)
+        with stats.stage("decode"):
+            sources = self._source_pool(image_paths, work_size)
+            main_shape = sources.shape(0)
+
+        with stats.stage("plan"):
+            # 3. 랜덤 조각 결정 (격자 배치 시 덮임 상태를 갱신하며 배치)
+            grid = self._create_occupancy_grid(canvas_size, layout_manager.main_area)
+            piece_plans = [self._plan_piece(sources, canvas_size, layout_manager, rng, grid)
+                           for _ in range(pieces)]
+
+            # 4. 메인 이미지 결정 (첫 번째 이미지)
+            main_area = layout_manager.main_area
+            main_plan = {
+                "crop_start": list(self.image_manager.random_crop_start(
+                    main_shape, main_area["width"], main_area["height"], rng)),
+                "angle": rng.randint(0, 359)
+            }
+
+        return {
+            "version": self.RECIPE_VERSION,
+            "seed": seed,
+            "image_paths": list(image_paths),
+            "canvas_size": [int(canvas_size[0]), int(canvas_size[1])],
+            "margin": self.canvas_margin,
+            "pieces": piece_plans,
+            "main": main_plan
+        }
+
+    # 레시피 렌더링 (scale: 캔버스 배율, 초안은 작게 / 최종은 1.0)
+    # stats(RenderStats)는 generate와 동일
+    def render_recipe(self, recipe, scale=1.0, progress=None, cancel_event=None, stats=None):
+        stats = stats or NULL_STATS
+        if recipe.get("version") != self.RECIPE_VERSION:
+            raise ValueError(f"지원하지 않는 레시피 버전: {recipe.get('version')}")
+
+        # 배율 적용한 캔버스 크기 및 여백
+        canvas_size, margin, work_size = self._scaled_sizes(recipe, scale)
+        total = len(recipe["pieces"]) + 1
+
         # 1. 캔버스 생성
-        canvas = self._create_canvas(canvas_size)
-        
+        with stats.stage("canvas"):
+            canvas = self._create_canvas(canvas_size, margin)
+        stats.add_allocation(canvas.nbytes)
+
         # 2. 레이아웃 설정
-        layout_manager = self._setup_layout(canvas_size)
-        
-        # 3. 소스 이미지 로드
-        source_images = self.image_manager.load_multiple(image_paths)
-        
+        layout_manager = LayoutManager(canvas_size=work_size)
+
+        # 3. 소스 풀 준비 (사용하는 이미지만 예산 안에서 미리 병렬 디코딩, 나머지는 사용 시 디코딩)
+        with stats.stage("decode"):
+            source_images = self._source_pool(recipe["image_paths"], work_size)
+            source_images.preload([piece["source"] for piece in recipe["pieces"]])
+
         # 4. 랜덤 조각들 먼저 배치
-        self._add_random_pieces(canvas, source_images, pieces, canvas_size, layout_manager)
-        
+        compositor = self._create_compositor()
+        for i, piece in enumerate(recipe["pieces"]):
+            self._check_cancel(cancel_event)
+            stats.begin_piece(i)
+            with stats.stage("decode"):
+                source_img = source_images[piece["source"]]
+            self._render_piece(canvas, source_img, piece, work_size, compositor, stats)
+            stats.end_piece()
+            if progress is not None:
+                progress(i + 1, total)
+
         # 5. 이후 메인 이미지 준비 및 배치
-        main_image = self._prepare_main_image(image_paths[0], layout_manager.main_area)
-        self._place_main_image(canvas, main_image, layout_manager.main_area)
-        
+        self._check_cancel(cancel_event)
+        with stats.stage("main"):
+            main_image = self._prepare_main_image(source_images[0], layout_manager.main_area, recipe["main"])
+            self._place_main_image(canvas, main_image, layout_manager.main_area, compositor)
+        stats.add_allocation(main_image[0].nbytes)
+        stats.add_blend(main_image[0])
+        if progress is not None:
+            progress(total, total)
+
+        # 병렬 합성 사용 시 기록된 배치를 한 번에 합성
+        if compositor is not None:
+            with stats.stage("composite"):
+                compositor.composite(canvas, opaque_canvas=True)
+
         # 6. 최종 크기로 자르기
-        final = self._crop_to_final_size(canvas, canvas_size)
-        
+        with stats.stage("crop"):
+            final = self._crop_to_final_size(canvas, canvas_size, margin)
+
         return final
 
-    # 작업용 캔버스 생성 (여백 포함)
-    def _create_canvas(self, canvas_size):
+    # 레시피를 애니메이션으로 저장 (output이 동영상 확장자면 cv2.VideoWriter, 아니면 프레임 이미지 폴더)
+    # motions: "appear", "drift", "rotate" 조합, 바뀐 조각이 덮는 영역만 프레임마다 다시 합성
+    def animate(self, recipe, output, frames=120, fps=30, scale=1.0, motions=("appear",),
+                progress=None, cancel_event=None):
+        animator = CollageAnimator(self, motions)
+        animator.save(recipe, output, frames, fps, scale, progress, cancel_event)
+
+    # 작업 캔버스를 덮는 해상도로 축소 디코딩하는 지연 로딩 소스 풀
+    def _source_pool(self, image_paths, work_size):
+        return SourcePool(self.image_manager, image_paths, work_size, self.pool_max_images, self.pool_max_bytes)
+
+    # 레시피 캔버스에 배율을 적용한 (캔버스 크기, 여백, 작업 캔버스 크기)
+    def _scaled_sizes(self, recipe, scale):
+        cw, ch = recipe["canvas_size"]
+        canvas_size = (max(1, int(round(cw * scale))), max(1, int(round(ch * scale))))
+        margin = int(round(recipe["margin"] * scale))
+        return canvas_size, margin, self._work_size(canvas_size, margin)
+
+    # 취소 요청 확인
+    def _check_cancel(self, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+
+    # 여백을 포함한 작업 캔버스 크기
+    def _work_size(self, canvas_size, margin=None):
+        if margin is None:
+            margin = self.canvas_margin
         cw, ch = canvas_size
-        work_w = cw + self.canvas_margin * 2
-        work_h = ch + self.canvas_margin * 2
-        canvas = np.ones((work_h, work_w, 4), dtype=np.uint8) * 255
-        return canvas
+        return (cw + margin * 2, ch + margin * 2)
+
+    # 작업용 캔버스 생성 (여백 포함)
+    def _create_canvas(self, canvas_size, margin=None):
+        work_w, work_h = self._work_size(canvas_size, margin)
+        return self.canvas_allocator.allocate(work_w, work_h, 4, 255)
+
+    # 병렬 합성기 생성 (workers가 1 이하이고 front_to_back이 아니면 None, 즉시 합성 / None이면 CPU 코어 수)
+    def _create_compositor(self):
+        workers = self.workers or os.cpu_count() or 1
+        if workers > 1 or self.front_to_back:
+            return TiledCompositor(self.placer, self.tile_size, workers, self.front_to_back)
+        return None
+
+    # 패치 합성 (병렬 합성기가 있으면 기록만 하고 나중에 합성)
+    def _blend(self, canvas, patch, x, y, compositor=None, offset=None):
+        if compositor is not None:
+            compositor.add(patch, x, y, offset)
+        else:
+            # 작업 캔버스는 항상 불투명
+            self.placer.alpha_blend(canvas, patch, x, y, opaque_canvas=True, offset=offset)
+
+    # 회전 (trim_patches이면 잘린 패치와 원래 사각형 정보 반환)
+    # 반환값: (패치, offset, (전체 폭, 전체 높이))
+    def _rotate(self, img, angle):
+        if self.trim_patches:
+            patch, (ox, oy, full_w, full_h) = self.image_manager.rotate(img, angle, trim=True)
+            return patch, (ox, oy), (full_w, full_h)
+
+        patch = self.image_manager.rotate(img, angle)
+        return patch, None, (patch.shape[1], patch.shape[0])
 
     # 레이아웃 매니저 생성
     def _setup_layout(self, canvas_size):
-        cw, ch = canvas_size
-        work_w = cw + self.canvas_margin * 2
-        work_h = ch + self.canvas_margin * 2
-        return LayoutManager(canvas_size=(work_w, work_h))
-
-    # 메인 이미지 준비 (로드, 크롭, 마스크, 회전)
-    def _prepare_main_image(self, image_path, main_area):
-        # 이미지 로드
-        main_img = self.image_manager.load(image_path)
-        
-        # 크기 조정 및 랜덤 크롭
-        main_resized = self.image_manager.resize_and_crop_random(
+        return LayoutManager(canvas_size=self._work_size(canvas_size))
+
+    # 메인 이미지 준비 (크롭, 마스크, 회전)
+    def _prepare_main_image(self, main_img, main_area, main_plan):
+        # 크기 조정 및 레시피 위치 크롭
+        main_resized = self.image_manager.resize_and_crop(
             main_img,
             main_area["width"],
-            main_area["height"]
+            main_area["height"],
+            main_plan["crop_start"]
         )
-        
+
         # 마스크 적용
         mask_np = self.masker.create_main_mask(
             main_area["mask"],
@@ -71,82 +257,209 @@ class CollageGenerator:
             main_area["height"]
         )
         main_resized[:, :, 3] = mask_np
-        
-        # 랜덤 회전
-        main_resized = self.image_manager.rotate_random(main_resized)
-        
-        return main_resized
+
+        # 회전 (패치, offset, 회전된 전체 크기)
+        return self._rotate(main_resized, main_plan["angle"])
 
     # 메인 이미지를 캔버스 중앙에 배치
-    def _place_main_image(self, canvas, main_image, main_area):
-        rotated_h, rotated_w = main_image.shape[:2]
-        
-        # 중앙 배치 좌표 계산
+    def _place_main_image(self, canvas, main_image, main_area, compositor=None):
+        patch, offset, (rotated_w, rotated_h) = main_image
+
+        # 중앙 배치 좌표 계산 (회전된 전체 사각형 기준)
         center_x = main_area["x"] + main_area["width"] // 2 - rotated_w // 2
         center_y = main_area["y"] + main_area["height"] // 2 - rotated_h // 2
-        
+
         # 배치
-        self.placer.alpha_blend(canvas, main_image, center_x, center_y)
+        self._blend(canvas, patch, center_x, center_y, compositor, offset)
 
-    # 랜덤 조각들을 캔버스에 추가
-    def _add_random_pieces(self, canvas, source_images, pieces, canvas_size, layout_manager):
+    # 격자 배치용 덮임 격자 생성 (여백과 메인 이미지 원은 덮인 것으로 표시, 랜덤 배치면 None)
+    def _create_occupancy_grid(self, canvas_size, main_area):
+        if self.placement != "grid":
+            return None
+
+        margin = self.canvas_margin
+        work_size = self._work_size(canvas_size)
+        cell_size = max(self.grid_cell_size, min(work_size) // self.grid_short_side_cells)
+        grid = OccupancyGrid(work_size, (margin, margin, canvas_size[0], canvas_size[1]), cell_size)
+        grid.mark_circle(
+            (main_area["x"] + main_area["width"] / 2, main_area["y"] + main_area["height"] / 2),
+            min(main_area["width"], main_area["height"]) / 2
+        )
+        return grid
+
+    # 랜덤 조각 하나의 결정 사항 기록 (grid가 있으면 빈 곳 우선 배치 후 덮임 표시)
+    # sources: SourcePool (크기만 사용하므로 대부분 디코딩하지 않음)
+    def _plan_piece(self, sources, canvas_size, layout_manager, rng, grid=None):
         cw, ch = canvas_size
-        work_w = cw + self.canvas_margin * 2
-        work_h = ch + self.canvas_margin * 2
-        
-        for i in range(pieces):
-            # 랜덤 소스 이미지 선택
-            src = random.choice(source_images)
-            
-            # 조각 생성
-            patch = self._create_random_patch(src, cw, ch, layout_manager)
-            
-            # 배치 위치 결정
+        work_w, work_h = self._work_size(canvas_size)
+
+        # 랜덤 소스 이미지 선택
+        index = rng.randrange(len(sources))
+        sh, sw = sources.shape(index)
+
+        # 크롭 영역, 마스크 모양, 회전 각도
+        cx, cy, pw, ph = self._random_crop_box((sh, sw), cw, ch, layout_manager, rng)
+        shape = self.masker.random_piece_shape(pw, ph, layout_manager.get_polygon_config(), rng)
+        angle = rng.randint(0, 359)
+
+        # 배치 위치 결정 (회전된 전체 사각형 기준)
+        rot_mat, full_w, full_h = self.image_manager.rotation_matrix(pw, ph, angle)
+        if grid is None:
             px, py = self.placer.random_position_avoid_main(
                 (work_w, work_h),
-                (patch.shape[1], patch.shape[0]),
-                layout_manager.main_area
+                (full_w, full_h),
+                layout_manager.main_area,
+                rng
+            )
+        else:
+            px, py = self.placer.grid_position_avoid_main(
+                grid,
+                (work_w, work_h),
+                (full_w, full_h),
+                layout_manager.main_area,
+                rng
             )
-            
-            # 배치
-            self.placer.alpha_blend(canvas, patch, px, py)
 
-    # 소스 이미지로부터 랜덤 조각 생성
-    def _create_random_patch(self, source_img, canvas_w, canvas_h, layout_manager):
-        sh, sw = source_img.shape[:2]
-        
+            # 회전된 조각 외곽선을 캔버스 좌표로 옮겨 덮임 표시
+            outline = self.masker.shape_outline(shape, pw, ph)
+            outline = outline @ rot_mat[:, :2].T + rot_mat[:, 2] + (px, py)
+            grid.mark_polygon(outline)
+
+        return {
+            "source": index,
+            "crop": [cx / sw, cy / sh, (cx + pw) / sw, (cy + ph) / sh],
+            "size": [pw / work_w, ph / work_h],
+            "shape": shape,
+            "angle": angle,
+            "position": [px / work_w, py / work_h]
+        }
+
+    # 조각 크기 및 크롭 위치 결정 (cx, cy, pw, ph), source_shape: 소스 (높이, 폭)
+    def _random_crop_box(self, source_shape, canvas_w, canvas_h, layout_manager, rng):
+        sh, sw = source_shape
+
         # 레이아웃 매니저에서 조각 크기 범위 가져오기
         (min_w, max_w), (min_h, max_h) = layout_manager.get_piece_size_range(canvas_w, canvas_h)
-        
-        # 랜덤 조각 크기 결정
-        pw = random.randint(min_w, max_w)
-        ph = random.randint(min_h, max_h)
-        
+
+        # 랜덤 조각 크기 결정 (아주 작은 캔버스에서도 1픽셀 이상)
+        pw = max(1, rng.randint(min_w, max_w))
+        ph = max(1, rng.randint(min_h, max_h))
+
         # 소스 이미지보다 크지 않도록 조정
         if sw <= pw or sh <= ph:
             pw = min(pw, max(1, sw))
             ph = min(ph, max(1, sh))
-        
+
         # 랜덤 크롭
-        cx = random.randint(0, max(0, sw - pw))
-        cy = random.randint(0, max(0, sh - ph))
-        patch = source_img[cy:cy+ph, cx:cx+pw].copy()
-        
-        # 레이아웃 매니저에서 다각형 설정 가져오기
-        polygon_config = layout_manager.get_polygon_config()
-        polygon_mask = self.masker.create_piece_mask(pw, ph, polygon_config)
-        patch[:, :, 3] = polygon_mask
-        
-        # 랜덤 회전
-        patch = self.image_manager.rotate_random(patch)
-        
-        return patch
+        cx = rng.randint(0, max(0, sw - pw))
+        cy = rng.randint(0, max(0, sh - ph))
+        return cx, cy, pw, ph
+
+    # 레시피의 조각 하나를 현재 배율의 캔버스에 배치 (stats: mask/warp/blend 단계 기록)
+    def _render_piece(self, canvas, source_img, piece, work_size, compositor=None, stats=NULL_STATS):
+        layer = self._piece_layer(source_img, piece, work_size, stats)
+        patch, x, y, offset = self._warp_layer(layer, piece["angle"], layer["position"], work_size, stats)
+        if patch is None:
+            return
+
+        stats.add_allocation(patch.nbytes)
+        stats.add_blend(patch)
+        with stats.stage("blend"):
+            self._blend(canvas, patch, x, y, compositor, offset)
+
+    # 조각의 각도/위치와 무관한 부분 준비 (크롭 뷰, 크롭->조각 변환 행렬, 마스크)
+    # 반환값: {"crop", "scale_mat", "mask", "size": (pw, ph), "position": (px, py)}
+    # mask를 넘기면 (같은 조각을 같은 배율로 다시 준비할 때) 마스크를 다시 그리지 않고 사용
+    def _piece_layer(self, source_img, piece, work_size, stats=NULL_STATS, mask=None):
+        work_w, work_h = work_size
+        sh, sw = source_img.shape[:2]
+
+        # 배율 적용한 조각 크기와 위치
+        pw = max(1, int(round(piece["size"][0] * work_w)))
+        ph = max(1, int(round(piece["size"][1] * work_h)))
+        px = int(round(piece["position"][0] * work_w))
+        py = int(round(piece["position"][1] * work_h))
+
+        # 소스 좌표의 크롭 영역 (실수)
+        u0, v0, u1, v1 = piece["crop"]
+        u0, u1 = self._snap(u0 * sw), self._snap(u1 * sw)
+        v0, v1 = self._snap(v0 * sh), self._snap(v1 * sh)
+
+        # 조각이 크롭보다 절반 이하로 작으면 소스 피라미드의 가까운 단계에서 읽기
+        scale = max(pw / max(u1 - u0, 1e-6), ph / max(v1 - v0, 1e-6))
+        level, factor = self.image_manager.pyramid_level(source_img, scale)
+        if factor < 1.0:
+            source_img = level
+            sh, sw = level.shape[:2]
+            u0, u1, v0, v1 = u0 * factor, u1 * factor, v0 * factor, v1 * factor
+
+        # 크롭 영역을 감싸는 정수 영역 뷰
+        ix0, iy0 = int(math.floor(u0)), int(math.floor(v0))
+        ix1, iy1 = min(sw, int(math.ceil(u1))), min(sh, int(math.ceil(v1)))
+        crop = source_img[iy0:iy1, ix0:ix1]
+
+        # 크롭 뷰 좌표 -> 조각 좌표 변환 (배율 + 소수점 오프셋, 같은 해상도면 항등 변환)
+        kx = pw / max(u1 - u0, 1e-6)
+        ky = ph / max(v1 - v0, 1e-6)
+        scale_mat = np.array([[kx, 0, -kx * (u0 - ix0)],
+                              [0, ky, -ky * (v0 - iy0)],
+                              [0, 0, 1]], dtype=np.float64)
+
+        if mask is None:
+            with stats.stage("mask"):
+                mask = self.masker.draw_piece_mask(piece["shape"], pw, ph)
+            stats.add_allocation(mask.nbytes)
+
+        return {"crop": crop, "scale_mat": scale_mat, "mask": mask, "size": (pw, ph), "position": (px, py)}
+
+    # 준비된 조각을 angle만큼 회전하여 position(회전된 전체 사각형의 좌상단)에 놓을 패치 생성
+    # 반환값: (패치, x, y, offset), 캔버스 밖이면 패치가 None
+    def _warp_layer(self, layer, angle, position, work_size, stats=NULL_STATS):
+        crop, scale_mat, mask = layer["crop"], layer["scale_mat"], layer["mask"]
+        pw, ph = layer["size"]
+        px, py = position
+
+        if self.fused_pieces:
+            with stats.stage("warp"):
+                # 조각 좌표 -> 캔버스 좌표 (회전 + 배치)
+                rot_mat, _, _ = self.image_manager.rotation_matrix(pw, ph, angle)
+                rot_mat[0, 2] += px
+                rot_mat[1, 2] += py
+                crop_mat = rot_mat @ scale_mat
+
+                # 캔버스 안에 보이는 영역만 원본 크롭에서 한 번에 변환
+                patch, pos = self.image_manager.warp_piece(crop, mask, rot_mat, work_size, crop_mat)
+
+            if patch is None:
+                return None, 0, 0, None
+            return patch, pos[0], pos[1], None
+
+        with stats.stage("warp"):
+            # 조각 생성 (같은 해상도면 복사, 아니면 조각 크기로 변환)
+            if crop.shape[1] == pw and crop.shape[0] == ph and scale_mat[0, 0] == 1 and scale_mat[1, 1] == 1:
+                patch = crop.copy()
+            else:
+                patch = cv2.warpAffine(crop, scale_mat[:2], (pw, ph), borderMode=cv2.BORDER_REPLICATE)
+            patch[:, :, 3] = mask
+            stats.add_allocation(patch.nbytes)
+
+            # 회전 (회전된 전체 사각형 기준)
+            patch, offset, _ = self._rotate(patch, angle)
+
+        return patch, px, py, offset
+
+    # 부동소수점 오차로 정수에서 살짝 벗어난 좌표를 정수로 보정
+    def _snap(self, v):
+        r = round(v)
+        return float(r) if abs(v - r) < 1e-6 else v
 
     # 작업 캔버스에서 최종 크기로 자르기
-    def _crop_to_final_size(self, canvas, canvas_size):
+    def _crop_to_final_size(self, canvas, canvas_size, margin=None):
+        if margin is None:
+            margin = self.canvas_margin
         cw, ch = canvas_size
         final = canvas[
-            self.canvas_margin:self.canvas_margin + ch,
-            self.canvas_margin:self.canvas_margin + cw
+            margin:margin + ch,
+            margin:margin + cw
         ]
-        return final
\ No newline at end of file
+        return final
@@ -0,0 +1,385 @@
+import os
+import math
+import json
+import time
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from engine.collage_generator import CollageGenerator, GenerationCancelled
+from engine.exporter import ResultExporter
+
+# 요청 하나 (HTTP 스레드가 만들고 워커 스레드가 결과를 채움)
+class _ServiceJob:
+
+    def __init__(self, request):
+        self.request = request
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.data = None
+        self.seed = None
+        self.error = None
+
+
+# 상주 콜라주 서비스 (HTTP)
+# 워커 스레드마다 생성기를 하나씩 유지하고, 디코딩/피라미드 캐시는 모든 워커가 공유
+# 대기열이 가득 차면 바로 503으로 거절 (클라이언트는 Retry-After 후 재시도)
+#
+# POST /collage  {"image_paths": [...], "canvas_size": [w, h], "pieces": n, "seed": s,
+#                 "scale": 1.0, "format": "png" | "jpeg" | "webp"}  또는 {"recipe": {...}, ...}
+#   -> 인코딩된 이미지 (헤더 X-Seed, X-Queue-Seconds, X-Render-Seconds)
+# GET /health    -> 워커 수, 대기 중/처리 중 요청 수, 캐시 사용량 (JSON)
+class CollageService:
+
+    CONTENT_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+    # 요청/레시피 시드 상한
+    MAX_SEED = 2 ** 63 - 1
+
+    # workers: 동시에 렌더링하는 생성기 수, queue_size: 대기열 길이 (넘으면 503)
+    # generator_options: CollageGenerator 생성 인자, source_root: 지정하면 상대 경로 기준이며 밖의 파일은 거절
+    # request_timeout: 요청 하나의 최대 대기+렌더링 시간 (초과하면 취소 후 504)
+    # png_compression: 응답 PNG 압축 수준 (낮을수록 빠름)
+    # max_canvas_side / max_pieces: 요청(또는 레시피) 캔버스 한 변과 조각 수 상한 (넘으면 400)
+    def __init__(self, workers=2, queue_size=8, generator_options=None, source_root=None,
+                 request_timeout=120, png_compression=1, max_canvas_side=8000, max_pieces=2000):
+        self.workers = max(1, workers)
+        self.source_root = os.path.abspath(source_root) if source_root else None
+        self.request_timeout = request_timeout
+        self.max_canvas_side = max_canvas_side
+        self.max_pieces = max_pieces
+        self.encoder = ResultExporter(png_compression=png_compression, workers=1)
+
+        # 생성기는 워커마다 따로, ImageManager(디코딩 캐시 + 소스 피라미드)는 하나를 공유
+        self.generators = [CollageGenerator(**(generator_options or {})) for _ in range(self.workers)]
+        self.image_manager = self.generators[0].image_manager
+        for generator in self.generators[1:]:
+            generator.image_manager = self.image_manager
+
+        self._jobs = queue.Queue(maxsize=max(1, queue_size))
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._threads = []
+        self._server = None
+
+    # 워커 시작 후 HTTP 요청 처리 (shutdown이 호출될 때까지 반환하지 않음)
+    def serve(self, host="127.0.0.1", port=8765):
+        self.start_workers()
+        self._server = ThreadingHTTPServer((host, port), _ServiceHandler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._stop_workers()
+
+    # 서비스 종료 (다른 스레드에서 호출)
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    # 워커 스레드 시작 (serve가 호출, HTTP 없이 submit만 쓸 때 직접 호출)
+    def start_workers(self):
+        if self._threads:
+            return
+        for generator in self.generators:
+            thread = threading.Thread(target=self._worker_loop, args=(generator,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # 자주 쓰는 소스를 미리 디코딩해서 캐시에 올림
+    # 캐시 키에 작업 캔버스 크기가 들어가므로, 주로 요청받을 캔버스 크기(canvas_sizes)와 배율로 읽음
+    # (레시피 생성은 배율 1 크기로 메인 이미지를 읽으므로 배율이 1이 아니면 그 크기도 함께)
+    def warm(self, image_paths, canvas_sizes=((1000, 700),), scale=1.0):
+        generator = self.generators[0]
+        paths = [self._resolve(p) for p in image_paths]
+
+        work_sizes = []
+        for canvas_size in canvas_sizes:
+            recipe_size = {"canvas_size": tuple(canvas_size), "margin": generator.canvas_margin}
+            for work_scale in dict.fromkeys((scale, 1.0)):
+                work_size = generator._scaled_sizes(recipe_size, work_scale)[2]
+                if work_size not in work_sizes:
+                    work_sizes.append(work_size)
+
+        for work_size in work_sizes:
+            self.image_manager.load_multiple(paths, work_size)
+
+    # 요청을 대기열에 넣음 (가득 차면 queue.Full), 완료를 기다리려면 job.done.wait()
+    def submit(self, request):
+        job = _ServiceJob(self._normalize(request))
+        self._jobs.put_nowait(job)
+        return job
+
+    # 현재 상태 (GET /health)
+    def status(self):
+        cache = self.image_manager.cache
+        return {
+            "workers": self.workers,
+            "active": self._active,
+            "queued": self._jobs.qsize(),
+            "queue_size": self._jobs.maxsize,
+            "cache_bytes": cache.current_bytes if cache is not None else 0
+        }
+
+    # 요청 검증 및 기본값 채우기 (ValueError/FileNotFoundError -> 400/404)
+    def _normalize(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("요청은 객체여야 합니다.")
+        fmt = request.get("format", "png")
+        if fmt not in self.CONTENT_TYPES:
+            raise ValueError(f"지원하지 않는 형식: {fmt}")
+
+        recipe = request.get("recipe")
+        image_paths = request.get("image_paths", [])
+        if recipe is not None:
+            recipe = self._check_recipe(recipe)
+            recipe = dict(recipe, image_paths=[self._resolve(p) for p in recipe["image_paths"]])
+        elif not image_paths:
+            raise ValueError("image_paths 또는 recipe가 필요합니다.")
+        self._check_paths(image_paths, "image_paths")
+
+        return {
+            "image_paths": [self._resolve(p) for p in image_paths],
+            "canvas_size": self._check_canvas_size(request.get("canvas_size", [1000, 700]), "canvas_size"),
+            "pieces": self._check_int(request.get("pieces", 20), "pieces", 1, self.max_pieces),
+            "seed": self._check_seed(request.get("seed"), "seed"),
+            "scale": min(1.0, max(0.05, float(request.get("scale", 1.0)))),
+            "recipe": recipe,
+            "format": fmt
+        }
+
+    # 요청에 담긴 레시피 형식 확인 (렌더링 중 KeyError/IndexError/500 대신 400으로 거절)
+    def _check_recipe(self, recipe):
+        if not isinstance(recipe, dict):
+            raise ValueError("recipe는 객체여야 합니다.")
+        if recipe.get("version") != CollageGenerator.RECIPE_VERSION:
+            raise ValueError(f"지원하지 않는 레시피 버전: {recipe.get('version')}")
+        for key in ("image_paths", "canvas_size", "margin", "pieces", "main"):
+            if key not in recipe:
+                raise ValueError(f"레시피에 {key}가 없습니다.")
+
+        self._check_canvas_size(recipe["canvas_size"], "레시피의 canvas_size")
+        self._check_int(recipe["margin"], "레시피의 margin", 0, self.max_canvas_side)
+        self._check_seed(recipe.get("seed"), "레시피의 seed")
+
+        paths = recipe["image_paths"]
+        if not paths:
+            raise ValueError("레시피의 image_paths가 비어 있습니다.")
+        self._check_paths(paths, "레시피의 image_paths")
+
+        pieces = recipe["pieces"]
+        if not isinstance(pieces, list):
+            raise ValueError("레시피의 pieces는 목록이어야 합니다.")
+        if len(pieces) > self.max_pieces:
+            raise ValueError(f"레시피의 조각 수가 상한({self.max_pieces})을 넘습니다: {len(pieces)}")
+        for i, piece in enumerate(pieces):
+            if not isinstance(piece, dict):
+                raise ValueError(f"레시피 조각 {i}가 객체가 아닙니다.")
+            for key in ("source", "crop", "size", "position", "angle", "shape"):
+                if key not in piece:
+                    raise ValueError(f"레시피 조각 {i}에 {key}가 없습니다.")
+            self._check_piece(piece, i, len(paths))
+
+        main = recipe["main"]
+        if not isinstance(main, dict) or "crop_start" not in main or "angle" not in main:
+            raise ValueError("레시피의 main 형식이 잘못되었습니다.")
+        self._check_numbers(main["crop_start"], 2, "레시피 main의 crop_start")
+        self._check_number(main["angle"], "레시피 main의 angle")
+        return recipe
+
+    # 레시피 조각 하나의 값 형식 확인 (크롭/크기는 소스/작업 캔버스 대비 비율이므로 0~1)
+    def _check_piece(self, piece, i, num_sources):
+        source = piece["source"]
+        if not isinstance(source, int) or isinstance(source, bool) or not 0 <= source < num_sources:
+            raise ValueError(f"레시피 조각 {i}의 source가 범위를 벗어났습니다: {source}")
+
+        u0, v0, u1, v1 = self._check_numbers(piece["crop"], 4, f"레시피 조각 {i}의 crop")
+        if not (0 <= u0 < u1 <= 1 and 0 <= v0 < v1 <= 1):
+            raise ValueError(f"레시피 조각 {i}의 crop 범위가 잘못되었습니다: {piece['crop']}")
+        size = self._check_numbers(piece["size"], 2, f"레시피 조각 {i}의 size")
+        if not all(0 < v <= 1 for v in size):
+            raise ValueError(f"레시피 조각 {i}의 size 범위가 잘못되었습니다: {piece['size']}")
+        self._check_numbers(piece["position"], 2, f"레시피 조각 {i}의 position")
+        self._check_number(piece["angle"], f"레시피 조각 {i}의 angle")
+
+        shape = piece["shape"]
+        if not isinstance(shape, dict) or shape.get("type") not in ("rect", "polygon"):
+            raise ValueError(f"레시피 조각 {i}의 shape 형식이 잘못되었습니다: {shape}")
+        if shape["type"] == "polygon":
+            points = shape.get("points")
+            if not isinstance(points, list) or len(points) < 3:
+                raise ValueError(f"레시피 조각 {i}의 다각형 꼭짓점이 부족합니다.")
+            for point in points:
+                self._check_numbers(point, 2, f"레시피 조각 {i}의 다각형 꼭짓점")
+
+    # [w, h] 캔버스 크기 확인 (한 변이 1 ~ max_canvas_side), 반환값: (w, h)
+    def _check_canvas_size(self, size, name):
+        if not isinstance(size, (list, tuple)) or len(size) != 2:
+            raise ValueError(f"{name} 형식이 잘못되었습니다 (예: [1000, 700]): {size}")
+        return tuple(self._check_int(v, name, 1, self.max_canvas_side) for v in size)
+
+    # lo ~ hi 범위의 정수 확인
+    def _check_int(self, value, name, lo, hi):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{name}는 정수여야 합니다: {value}")
+        if not lo <= value <= hi:
+            raise ValueError(f"{name}는 {lo} ~ {hi} 범위여야 합니다: {value}")
+        return value
+
+    # 시드 확인 (없으면 None, 있으면 0 이상 정수)
+    def _check_seed(self, value, name):
+        if value is None:
+            return None
+        return self._check_int(value, name, 0, self.MAX_SEED)
+
+    # 유한한 숫자 확인
+    def _check_number(self, value, name):
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+            raise ValueError(f"{name}는 숫자여야 합니다: {value}")
+        return value
+
+    # 유한한 숫자 count개의 목록 확인, 반환값: 숫자 목록
+    def _check_numbers(self, values, count, name):
+        if not isinstance(values, list) or len(values) != count:
+            raise ValueError(f"{name}는 숫자 {count}개의 목록이어야 합니다: {values}")
+        return [self._check_number(v, name) for v in values]
+
+    # 소스 경로 목록 확인 (문자열 목록)
+    def _check_paths(self, paths, name):
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            raise ValueError(f"{name}는 경로 문자열 목록이어야 합니다.")
+
+    # 소스 경로 확인 (source_root가 있으면 그 안의 파일만 허용)
+    def _resolve(self, path):
+        if self.source_root is not None:
+            full = os.path.abspath(os.path.join(self.source_root, path))
+            if os.path.commonpath([full, self.source_root]) != self.source_root:
+                raise ValueError(f"허용되지 않은 경로: {path}")
+            path = full
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"파일을 찾을 수 없습니다: {path}")
+        return path
+
+    # 워커 스레드: 대기열에서 요청을 꺼내 렌더링 후 인코딩 (None을 받으면 종료)
+    def _worker_loop(self, generator):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if job.cancel_event.is_set():
+                continue
+
+            with self._active_lock:
+                self._active += 1
+            job.started = time.perf_counter()
+            try:
+                req = job.request
+                recipe = req["recipe"] or generator.create_recipe(
+                    req["image_paths"], req["canvas_size"], req["pieces"], req["seed"])
+                result = generator.render_recipe(recipe, req["scale"], cancel_event=job.cancel_event)
+                job.data = self.encoder.encode(result, req["format"])
+                job.seed = recipe.get("seed")
+            except Exception as e:
+                job.error = e
+            finally:
+                job.finished = time.perf_counter()
+                with self._active_lock:
+                    self._active -= 1
+                job.done.set()
+
+    # 워커 종료 신호 전달 후 대기
+    def _stop_workers(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+# HTTP 요청 처리 (server.service가 CollageService)
+class _ServiceHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # 응답 본문을 나눠서 보내는 크기
+    CHUNK_SIZE = 1024 * 1024
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, self.server.service.status())
+        else:
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/collage":
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+            return
+
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job = service.submit(request)
+        except queue.Full:
+            self._send_json(503, {"error": "대기 중인 요청이 너무 많습니다."}, {"Retry-After": "1"})
+            return
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+            return
+        except (ValueError, TypeError, KeyError) as e:
+            self._send_json(400, {"error": f"잘못된 요청: {e}"})
+            return
+
+        # 시간 안에 끝나지 않으면 취소 (대기 중이면 워커가 건너뛰고, 렌더링 중이면 조각 사이에서 중단)
+        if not job.done.wait(service.request_timeout):
+            job.cancel_event.set()
+            self._send_json(504, {"error": "렌더링 시간이 초과되었습니다."})
+            return
+
+        if isinstance(job.error, GenerationCancelled):
+            self._send_json(504, {"error": "렌더링 시간이 초과되었습니다."})
+            return
+        if isinstance(job.error, FileNotFoundError):
+            self._send_json(404, {"error": str(job.error)})
+            return
+        if job.error is not None:
+            self._send_json(500, {"error": f"{type(job.error).__name__}: {job.error}"})
+            return
+
+        # 시드는 검증된 정수만 헤더에 기록 (시드 없는 레시피면 생략)
+        headers = {
+            "X-Queue-Seconds": f"{job.started - job.submitted:.3f}",
+            "X-Render-Seconds": f"{job.finished - job.started:.3f}"
+        }
+        if isinstance(job.seed, int):
+            headers["X-Seed"] = f"{job.seed:d}"
+        self._send_bytes(200, job.data, CollageService.CONTENT_TYPES[job.request["format"]], headers)
+
+    # JSON 응답
+    def _send_json(self, code, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self._send_bytes(code, data, "application/json; charset=utf-8", headers)
+
+    # 응답 전송 (큰 이미지는 나눠서 쓰고, 클라이언트가 끊으면 무시)
+    def _send_bytes(self, code, data, content_type, headers=None):
+        try:
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+
+            view = memoryview(data)
+            for start in range(0, len(view), self.CHUNK_SIZE):
+                self.wfile.write(view[start:start + self.CHUNK_SIZE])
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    # 요청마다 찍히는 기본 로그 끄기 (오류 로그는 유지)
+    def log_request(self, code="-", size="-"):
+        pass
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# 배치를 먼저 기록한 뒤 캔버스 타일 단위로 병렬 합성하는 클래스
+class TiledCompositor:
+
+    # front_to_back=True이면 타일마다 위에서부터 under 연산으로 합성하고
+    # 이미 불투명해진 픽셀/타일 아래의 배치는 건너뜀 (결과는 뒤에서 앞으로 합성한 것과 반올림 오차 내 일치)
+    def __init__(self, placer, tile_size=512, workers=None, front_to_back=False):
+        self.placer = placer
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        self.front_to_back = front_to_back
+
+        # (패치, x, y) 목록, 리스트 순서가 곧 z-order (뒤쪽이 위)
+        self.placements = []
+
+    # 배치 기록 (offset은 Placer.alpha_blend와 동일한 의미)
+    def add(self, patch, x, y, offset=None):
+        if offset is not None:
+            x += offset[0]
+            y += offset[1]
+        self.placements.append((patch, x, y))
+
+    # 기록된 배치를 타일별로 병렬 합성 후 기록 비우기
+    def composite(self, canvas, opaque_canvas=False):
+        tiles = self._assign_tiles(canvas.shape[1], canvas.shape[0])
+
+        composite_tile = self._composite_tile_front if self.front_to_back else self._composite_tile
+
+        # 타일끼리는 영역이 겹치지 않으므로 동시에 기록해도 안전
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(composite_tile, canvas, tile, indices, opaque_canvas)
+                       for tile, indices in tiles]
+            for future in futures:
+                future.result()
+
+        self.placements = []
+
+    # 타일마다 겹치는 배치 인덱스 목록 생성 (z-order 유지)
+    def _assign_tiles(self, cw, ch):
+        ts = self.tile_size
+        cols = (cw + ts - 1) // ts
+        rows = (ch + ts - 1) // ts
+        buckets = [[] for _ in range(rows * cols)]
+
+        for i, (patch, x, y) in enumerate(self.placements):
+            ph, pw = patch.shape[:2]
+            x1, y1 = max(0, x), max(0, y)
+            x2, y2 = min(cw, x + pw), min(ch, y + ph)
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            for r in range(y1 // ts, (y2 - 1) // ts + 1):
+                for c in range(x1 // ts, (x2 - 1) // ts + 1):
+                    buckets[r * cols + c].append(i)
+
+        tiles = []
+        for r in range(rows):
+            for c in range(cols):
+                indices = buckets[r * cols + c]
+                if indices:
+                    tx, ty = c * ts, r * ts
+                    tiles.append(((tx, ty, min(ts, cw - tx), min(ts, ch - ty)), indices))
+        return tiles
+
+    # 타일 하나에 해당 배치들을 순서대로 합성
+    def _composite_tile(self, canvas, tile, indices, opaque_canvas):
+        tx, ty, tw, th = tile
+        view = canvas[ty:ty + th, tx:tx + tw]
+        for i in indices:
+            patch, x, y = self.placements[i]
+            self.placer.alpha_blend(view, patch, x - tx, y - ty, opaque_canvas=opaque_canvas)
+
+    # 타일 하나를 맨 위 배치부터 under 연산으로 누적한 뒤 캔버스에 확정
+    def _composite_tile_front(self, canvas, tile, indices, opaque_canvas):
+        tx, ty, tw, th = tile
+        view = canvas[ty:ty + th, tx:tx + tw]
+
+        color = np.zeros((th, tw, 3), dtype=np.float32)
+        trans = np.ones((th, tw), dtype=np.float32)
+
+        for i in reversed(indices):
+            patch, x, y = self.placements[i]
+            self.placer.alpha_under(color, trans, patch, x - tx, y - ty)
+
+            # 타일 전체가 불투명해지면 아래 배치는 모두 생략
+            if trans.max() < self.placer.OPAQUE_EPS:
+                break
+
+        self.placer.resolve_under(view, color, trans, opaque_canvas)
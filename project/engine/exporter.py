@@ -0,0 +1,105 @@
+import os
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# 결과 이미지 내보내기 클래스 (형식별 인코딩을 병렬로, 저장 작업은 백그라운드 스레드에서)
+# 형식은 확장자로 결정: .png, .jpg/.jpeg, .webp (BGRA 입력, JPEG는 알파 제거)
+class ResultExporter:
+
+    FORMATS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+
+    # png_compression: 0(빠름, 큼) ~ 9(느림, 작음), jpeg_quality / webp_quality: 1 ~ 100 (webp는 100 초과 시 무손실)
+    # workers: 동시에 인코딩하는 출력 수 (cv2 인코더는 GIL을 놓으므로 스레드로 병렬 처리)
+    def __init__(self, png_compression=3, jpeg_quality=95, webp_quality=90, workers=4):
+        if not 0 <= png_compression <= 9:
+            raise ValueError(f"PNG 압축 수준은 0~9 사이여야 합니다: {png_compression}")
+        self.png_compression = png_compression
+        self.jpeg_quality = jpeg_quality
+        self.webp_quality = webp_quality
+
+        self._encoders = ThreadPoolExecutor(max_workers=max(1, workers))
+
+        # 저장 작업은 요청 순서대로 하나씩 (인코딩만 병렬)
+        self._jobs = ThreadPoolExecutor(max_workers=1)
+
+    # 백그라운드 저장 시작, concurrent.futures.Future 반환 (결과는 export의 반환값)
+    # 호출 후 원본이 바뀌어도 되도록 이미지를 복사해 둠
+    def submit(self, img, outputs, thumbnail=None):
+        snapshot = np.array(img, copy=True)
+        return self._jobs.submit(self.export, snapshot, outputs, thumbnail)
+
+    # 이미지를 여러 파일로 저장 (outputs: 경로 목록, thumbnail: (경로, 긴 변 크기))
+    # 반환값: {"outputs": [{"path", "format", "bytes", "seconds"}, ...], "seconds": 전체 시간}
+    def export(self, img, outputs, thumbnail=None):
+        start = time.perf_counter()
+        if isinstance(outputs, str):
+            outputs = [outputs]
+
+        targets = [(path, img) for path in outputs]
+        if thumbnail is not None:
+            thumb_path, thumb_size = thumbnail
+            targets.append((thumb_path, self.thumbnail(img, thumb_size)))
+
+        # 형식 확인은 인코딩 시작 전에 (일부만 저장되는 일이 없도록)
+        for path, _ in targets:
+            self.format_of(path)
+
+        futures = [self._encoders.submit(self._write, path, target) for path, target in targets]
+        reports = [f.result() for f in futures]
+        return {"outputs": reports, "seconds": time.perf_counter() - start}
+
+    # 확장자로 형식 이름 결정
+    def format_of(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in self.FORMATS:
+            raise ValueError(f"지원하지 않는 저장 형식: {path}")
+        return self.FORMATS[ext]
+
+    # 형식에 맞게 메모리에서 인코딩 (bytes 반환)
+    def encode(self, img, fmt):
+        if fmt == "png":
+            ok, buf = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+        elif fmt == "jpeg":
+            if img.ndim == 3 and img.shape[2] == 4:
+                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+            ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        elif fmt == "webp":
+            ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality])
+        else:
+            raise ValueError(f"지원하지 않는 저장 형식: {fmt}")
+
+        if not ok:
+            raise IOError(f"이미지 인코딩 실패: {fmt}")
+        return buf.tobytes()
+
+    # 긴 변이 size가 되도록 축소한 미리보기 이미지 (원본이 더 작으면 그대로)
+    def thumbnail(self, img, size):
+        h, w = img.shape[:2]
+        scale = size / max(w, h)
+        if scale >= 1.0:
+            return img
+        tw, th = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        return cv2.resize(img, (tw, th), interpolation=cv2.INTER_AREA)
+
+    # 작업 종료 (wait=True이면 진행 중인 저장이 끝날 때까지 대기)
+    def shutdown(self, wait=True):
+        self._jobs.shutdown(wait=wait)
+        self._encoders.shutdown(wait=wait)
+
+    # 파일 하나 인코딩 후 저장 (임시 파일에 쓴 뒤 교체하여 중간 상태 파일이 남지 않게)
+    def _write(self, path, img):
+        start = time.perf_counter()
+        fmt = self.format_of(path)
+        data = self.encode(img, fmt)
+
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        return {"path": path, "format": fmt, "bytes": len(data), "seconds": time.perf_counter() - start}
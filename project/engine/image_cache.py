@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 디코딩된 이미지 LRU 캐시 클래스 (바이트 예산 기준, 여러 스레드에서 동시에 사용 가능)
+class ImageCache:
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+
+        # (경로, 변형) -> (파일 스탬프, 이미지), 뒤쪽일수록 최근 사용
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # 파일 변경 감지용 스탬프 (수정 시각, 크기)
+    def _stamp(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    # 캐시 조회 (파일이 바뀌었으면 무효화 후 None)
+    # variant: 같은 파일의 다른 디코딩 결과 구분용 (예: 축소 디코딩 크기)
+    def get(self, path, variant=None):
+        key = (os.path.abspath(path), variant)
+        stamp = self._stamp(key[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] != stamp:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    # 캐시 저장 (예산 초과 시 오래된 항목부터 제거)
+    def put(self, path, img, variant=None):
+        key = (os.path.abspath(path), variant)
+        stamp = self._stamp(key[0])
+        if stamp is None or img.nbytes > self.max_bytes:
+            return
+
+        # 공유되는 배열이므로 호출자가 수정하지 못하도록 읽기 전용 처리
+        img.flags.writeable = False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (stamp, img)
+            self.current_bytes += img.nbytes
+
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    # 항목 제거 (잠금을 잡은 상태에서 호출)
+    def _remove(self, key):
+        _, img = self._entries.pop(key)
+        self.current_bytes -= img.nbytes
+
+    # 전체 비우기
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
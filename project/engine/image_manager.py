@@ -1,18 +1,82 @@
 import cv2
+import math
+import os
 import numpy as np
 import random
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from engine.image_cache import ImageCache
+
+# 여러 이미지 로드 중 일부가 실패했을 때 발생하는 예외 (errors: [(경로, 예외), ...])
+class ImageLoadError(FileNotFoundError):
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = "\n".join(f"{path}: {e}" for path, e in errors)
+        super().__init__(f"이미지 {len(errors)}개 로딩 실패:\n{lines}")
+
 
 # 이미지 로딩 및 변환 관리 클래스
 class ImageManager:
     
-    def __init__(self, resize_scale_factor=1.4):
+    # load_workers: load_multiple의 동시 디코딩 스레드 수 (1이면 순차)
+    # use_pyramids=True이면 크게 축소할 때 소스의 2배 축소 피라미드 중 가까운 단계에서 읽음
+    def __init__(self, resize_scale_factor=1.4, cache_bytes=512 * 1024 * 1024, load_workers=4,
+                 use_pyramids=True):
         self.resize_scale_factor = resize_scale_factor
+        self.load_workers = load_workers
+        self.use_pyramids = use_pyramids
+
+        # resize_and_crop: 확대 면적이 크롭 면적의 이 배수를 넘을 때만 크롭 영역만 리샘플링
+        self.roi_resize_ratio = 8.0
+
+        # 디코딩 결과 캐시 (0이면 사용 안 함)
+        self.cache = ImageCache(cache_bytes) if cache_bytes > 0 else None
+
+        # 소스 배열 id -> (약한 참조, 축소 단계 목록), 소스가 해제되면 함께 제거
+        self._pyramids = {}
+        self._pyramid_lock = threading.Lock()
+
+        # 다른 프로세스가 공유 메모리에 디코딩해 둔 이미지 ((절대 경로, 목표 크기) -> 읽기 전용 배열)
+        # 있으면 디코딩/캐시 없이 그대로 반환 (engine.shared_sources 참고)
+        self.shared_images = {}
+
+    # 이미지 로드 및 BGRA 변환 (캐시된 결과는 읽기 전용 배열)
+    # target_size=(w, h)가 주어지면 그 크기를 덮는 최소 해상도로 축소 디코딩
+    def load(self, path, target_size=None):
+        variant = tuple(target_size) if target_size is not None else None
+        if self.shared_images:
+            shared = self.shared_images.get((os.path.abspath(path), variant))
+            if shared is not None:
+                return shared
+
+        if self.cache is not None:
+            cached = self.cache.get(path, variant)
+            if cached is not None:
+                return cached
 
-    # 이미지 로드 및 BGRA 변환
-    def load(self, path):
-        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        img = self._decode(path, target_size)
+
+        if self.cache is not None:
+            self.cache.put(path, img, variant)
+        return img
+
+    # 파일 디코딩 및 BGRA 변환
+    def _decode(self, path, target_size=None):
+        flags = cv2.IMREAD_UNCHANGED
+        if target_size is not None:
+            size = self._read_jpeg_size(path)
+            if size is not None:
+                flags = self._reduced_jpeg_flag(size, target_size)
+
+        img = cv2.imread(path, flags)
         if img is None:
             raise FileNotFoundError(f"이미지 로딩 실패: {path}")
+
+        # BGRA 변환 전에 남은 배율만큼 영역 보간으로 축소
+        if target_size is not None:
+            img = self._shrink_to_cover(img, target_size)
         
         if len(img.shape) == 2:
             img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
@@ -21,33 +85,236 @@ class ImageManager:
         
         return img
 
-    # 여러 이미지 로드
-    def load_multiple(self, paths):
-        return [self.load(path) for path in paths]
+    # 목표 크기를 덮는 가장 작은 JPEG 축소 디코딩 플래그 선택 (1/2, 1/4, 1/8)
+    def _reduced_jpeg_flag(self, size, target_size):
+        factor = self._reduced_jpeg_factor(size, target_size)
+        if factor == 1:
+            return cv2.IMREAD_UNCHANGED
 
-    # 이미지를 확대 후 랜덤 크롭
-    def resize_and_crop_random(self, img, target_width, target_height):
+        flag = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}[factor]
+        # IMREAD_UNCHANGED와 같은 방향을 유지하도록 EXIF 회전 무시
+        return flag | cv2.IMREAD_IGNORE_ORIENTATION
+
+    # 목표 크기를 덮는 가장 큰 JPEG 축소 배율 (8, 4, 2, 없으면 1)
+    def _reduced_jpeg_factor(self, size, target_size):
+        w, h = size
+        tw, th = target_size
+        for factor in (8, 4, 2):
+            if w // factor >= tw and h // factor >= th:
+                return factor
+        return 1
+
+    # 목표 크기를 덮는 크기까지 축소 (확대는 하지 않음)
+    def _shrink_to_cover(self, img, target_size):
         h, w = img.shape[:2]
+        new_w, new_h = self._cover_size((w, h), target_size)
+        if (new_w, new_h) == (w, h):
+            return img
+        return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    # (w, h)를 목표 크기를 덮는 크기로 축소했을 때의 크기 (확대가 필요하면 그대로)
+    def _cover_size(self, size, target_size):
+        w, h = size
+        tw, th = target_size
+        scale = max(tw / w, th / h)
+        if scale >= 1.0:
+            return w, h
+
+        return max(tw, int(np.ceil(w * scale))), max(th, int(np.ceil(h * scale)))
+
+    # 디코딩하지 않고 load(path, target_size) 결과의 (폭, 높이) 계산
+    # JPEG 헤더만 읽으며, JPEG가 아니거나 헤더를 읽지 못하면 None
+    def decoded_size(self, path, target_size=None):
+        size = self._read_jpeg_size(path)
+        if size is None or target_size is None:
+            return size
+
+        # 축소 디코딩은 올림 크기 (libjpeg 배율 디코딩)
+        factor = self._reduced_jpeg_factor(size, target_size)
+        w, h = -(-size[0] // factor), -(-size[1] // factor)
+        return self._cover_size((w, h), target_size)
+
+    # JPEG 헤더에서 (폭, 높이) 읽기, JPEG가 아니거나 실패하면 None
+    def _read_jpeg_size(self, path):
+        try:
+            with open(path, "rb") as f:
+                if f.read(2) != b"\xff\xd8":
+                    return None
+
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xFF:
+                        return None
+
+                    # 채움 바이트(0xFF) 건너뛰기
+                    while marker[1] == 0xFF:
+                        marker = marker[1:] + f.read(1)
+                        if len(marker) < 2:
+                            return None
+
+                    code = marker[1]
+                    if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+                        continue
+
+                    length_bytes = f.read(2)
+                    if len(length_bytes) < 2:
+                        return None
+                    length = int.from_bytes(length_bytes, "big")
+
+                    # SOF 마커 (DHT, JPG, DAC 제외)
+                    if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                        header = f.read(5)
+                        if len(header) < 5:
+                            return None
+                        h = int.from_bytes(header[1:3], "big")
+                        w = int.from_bytes(header[3:5], "big")
+                        return (w, h) if w > 0 and h > 0 else None
+
+                    f.seek(length - 2, 1)
+        except OSError:
+            return None
+
+    # 여러 이미지 로드 (입력 순서대로 반환)
+    # cv2.imread는 GIL을 풀어주므로 스레드 풀에서 동시에 디코딩 (같은 경로는 한 번만)
+    # 실패한 경로를 모두 모아서 ImageLoadError 발생
+    def load_multiple(self, paths, target_size=None):
+        unique = list(dict.fromkeys(paths))
+        workers = min(self.load_workers, len(unique))
+
+        if workers <= 1:
+            outcomes = [self._try_load(path, target_size) for path in unique]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(lambda path: self._try_load(path, target_size), unique))
+
+        errors = [(path, e) for path, (_, e) in zip(unique, outcomes) if e is not None]
+        if errors:
+            raise ImageLoadError(errors)
+
+        images = {path: img for path, (img, _) in zip(unique, outcomes)}
+        return [images[path] for path in paths]
+
+    # 이미지 하나 로드, (이미지, None) 또는 (None, 예외) 반환
+    def _try_load(self, path, target_size):
+        try:
+            return self.load(path, target_size), None
+        except Exception as e:
+            return None, e
+
+    # 결과 이미지 저장 (JPG는 BGR 변환 후 저장)
+    def save(self, path, img, jpeg_quality=95):
+        if path.lower().endswith(".jpg") or path.lower().endswith(".jpeg"):
+            bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+            ok = cv2.imwrite(path, bgr, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        else:
+            ok = cv2.imwrite(path, img)
+
+        if not ok:
+            raise IOError(f"이미지 저장 실패: {path}")
+
+    # 이미지를 확대 후 랜덤 크롭
+    def resize_and_crop_random(self, img, target_width, target_height, rng=None):
+        start = self.random_crop_start(img.shape[:2], target_width, target_height, rng)
+        return self.resize_and_crop(img, target_width, target_height, start)
+
+    # 확대 크기 계산 (목표 크기를 덮는 배율 * resize_scale_factor), shape: 원본 (높이, 폭)
+    def _resized_size(self, shape, target_width, target_height):
+        h, w = shape[:2]
         
         scale_w = target_width / w
         scale_h = target_height / h
         scale = max(scale_w, scale_h) * self.resize_scale_factor
         
-        new_w, new_h = int(w * scale), int(h * scale)
-        resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+        return int(w * scale), int(h * scale)
+
+    # 랜덤 크롭 시작 위치 결정 (확대된 이미지 크기 대비 비율, 해상도와 무관)
+    # shape: 원본 (높이, 폭) (크기만 필요하므로 디코딩하지 않아도 됨), rng: random 모듈 또는 random.Random 객체
+    def random_crop_start(self, shape, target_width, target_height, rng=None):
+        rng = rng or random
+        new_w, new_h = self._resized_size(shape, target_width, target_height)
         
         max_start_x = max(0, new_w - target_width)
         max_start_y = max(0, new_h - target_height)
         
-        start_x = random.randint(0, max_start_x)
-        start_y = random.randint(0, max_start_y)
-        
-        cropped = resized[start_y:start_y+target_height, start_x:start_x+target_width]
-        return cropped
+        start_x = rng.randint(0, max_start_x)
+        start_y = rng.randint(0, max_start_y)
+        return start_x / new_w, start_y / new_h
 
-    # 이미지 회전
-    def rotate(self, img, angle):
+    # 이미지를 확대 후 지정한 비율 위치에서 크롭 (크게 축소하는 경우 가까운 피라미드 단계에서 리샘플링)
+    # 확대 이미지가 크롭보다 훨씬 크면 전체를 확대하지 않고 크롭 창에 해당하는 소스 영역(+ 필터 여유)만 리샘플링
+    def resize_and_crop(self, img, target_width, target_height, start):
+        new_w, new_h = self._resized_size(img.shape, target_width, target_height)
         h, w = img.shape[:2]
+        level, _ = self.pyramid_level(img, max(new_w / w, new_h / h))
+        lh, lw = level.shape[:2]
+
+        start_x = min(int(round(start[0] * new_w)), max(0, new_w - target_width))
+        start_y = min(int(round(start[1] * new_h)), max(0, new_h - target_height))
+        out_w = min(target_width, new_w - start_x)
+        out_h = min(target_height, new_h - start_y)
+
+        # warpAffine(LANCZOS4)은 출력 픽셀당 비용이 resize의 6~7배이므로 버리는 영역이 작으면 전체 확대가 더 빠름
+        if new_w * new_h <= self.roi_resize_ratio * out_w * out_h:
+            resized = cv2.resize(level, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+            return resized[start_y:start_y+out_h, start_x:start_x+out_w]
+
+        # 확대 이미지 픽셀 중심 -> 소스 좌표 (cv2.resize와 같은 대응)
+        sx, sy = lw / new_w, lh / new_h
+        x0 = (start_x + 0.5) * sx - 0.5
+        y0 = (start_y + 0.5) * sy - 0.5
+
+        # 크롭 창이 덮는 소스 영역 + Lanczos4 필터 반경(4픽셀)
+        x1 = max(0, int(math.floor(x0)) - 4)
+        y1 = max(0, int(math.floor(y0)) - 4)
+        x2 = min(lw, int(math.ceil(x0 + (out_w - 1) * sx)) + 5)
+        y2 = min(lh, int(math.ceil(y0 + (out_h - 1) * sy)) + 5)
+
+        # 출력 좌표 -> ROI 좌표 역변환 (소수점 위치까지 전체 확대와 같은 대응, 가장자리는 복제)
+        mat = np.array([[sx, 0, x0 - x1], [0, sy, y0 - y1]], dtype=np.float64)
+        cropped = cv2.warpAffine(level[y1:y2, x1:x2], mat, (out_w, out_h),
+                                 flags=cv2.INTER_LANCZOS4 | cv2.WARP_INVERSE_MAP,
+                                 borderMode=cv2.BORDER_REPLICATE)
+        return cropped
+
+    # img를 scale 배율로 읽을 때 사용할 피라미드 단계와 그 배율 (원본 좌표 * 배율 = 단계 좌표)
+    # 배율 이상의 해상도를 가진 가장 작은 단계 선택 (scale > 0.5이면 원본 그대로)
+    def pyramid_level(self, img, scale):
+        level, factor = img, 1.0
+        if not self.use_pyramids:
+            return level, factor
+
+        k = 0
+        while factor * 0.5 >= scale:
+            next_level = self._pyramid_level_k(img, k + 1)
+            if next_level is None:
+                break
+            level, factor, k = next_level, factor * 0.5, k + 1
+        return level, factor
+
+    # img의 k번째 축소 단계 (필요할 때 만들어서 캐시, 너무 작아지면 None)
+    def _pyramid_level_k(self, img, k):
+        key = id(img)
+        with self._pyramid_lock:
+            entry = self._pyramids.get(key)
+            if entry is None or entry[0]() is not img:
+                entry = (weakref.ref(img, lambda _, key=key: self._pyramids.pop(key, None)), [])
+                self._pyramids[key] = entry
+            levels = entry[1]
+
+            while len(levels) < k:
+                prev = levels[-1] if levels else img
+                h, w = prev.shape[:2]
+                if h < 2 or w < 2:
+                    return None
+
+                # 2x2 평균 (홀수 끝 행/열은 버려서 좌표 배율이 정확히 1/2)
+                half = cv2.resize(prev[:h // 2 * 2, :w // 2 * 2], (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+                half.flags.writeable = False
+                levels.append(half)
+            return levels[k - 1]
+
+    # 회전 행렬과 회전 후 전체 크기 계산 (잘림 없이 확장)
+    def rotation_matrix(self, w, h, angle):
         cx, cy = w // 2, h // 2
 
         rot_mat = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
@@ -59,13 +326,91 @@ class ImageManager:
 
         rot_mat[0, 2] += (new_w / 2) - cx
         rot_mat[1, 2] += (new_h / 2) - cy
+        return rot_mat, new_w, new_h
+
+    # 이미지 회전
+    # trim=True이면 알파가 0이 아닌 영역만 잘라서 (패치, (ox, oy, 전체 폭, 전체 높이)) 반환
+    # (ox, oy)는 회전된 전체 사각형 안에서 잘린 패치의 위치
+    def rotate(self, img, angle, trim=False):
+        h, w = img.shape[:2]
+        rot_mat, new_w, new_h = self.rotation_matrix(w, h, angle)
+
+        if not trim:
+            rotated = cv2.warpAffine(img, rot_mat, (new_w, new_h), 
+                                    borderMode=cv2.BORDER_CONSTANT, 
+                                    borderValue=(0, 0, 0, 0))
+            return rotated
+
+        # 원본 알파 영역을 회전 좌표로 옮겨 필요한 영역만 변환
+        bbox = self._nonzero_bbox(img[:, :, 3])
+        bounds = self._transformed_bounds(rot_mat, bbox, (new_w, new_h))
+        if bounds is None:
+            return img[:0, :0], (0, 0, new_w, new_h)
+
+        x1, y1, x2, y2 = bounds
+        rotated = self._warp_region(img, rot_mat, bounds)
+
+        # 실제 알파 영역으로 한 번 더 잘라내기
+        tx, ty, tw, th = self._nonzero_bbox(rotated[:, :, 3])
+        trimmed = rotated[ty:ty+th, tx:tx+tw]
+        return trimmed, (x1 + tx, y1 + ty, new_w, new_h)
+
+    # 크롭 영역을 목적지 좌표로 한 번에 변환 (마스크 적용, 확대/축소, 회전, 배치 통합)
+    # crop: 원본의 크롭 영역 뷰 (복사하지 않음), mat: 마스크(조각) 좌표 -> 목적지 좌표 변환
+    # crop_mat: 크롭 좌표 -> 목적지 좌표 변환 (None이면 크롭이 조각과 같은 해상도라고 보고 mat 사용)
+    # 반환값: (마스크가 알파로 들어간 BGRA 패치, 목적지 좌표 (x, y)), 보이는 영역이 없으면 (None, None)
+    def warp_piece(self, crop, mask, mat, dst_size, crop_mat=None):
+        bounds = self._transformed_bounds(mat, self._nonzero_bbox(mask), dst_size)
+        if bounds is None:
+            return None, None
+
+        # 색상은 크롭 뷰에서, 알파는 마스크에서 가져옴 (원본 알파는 사용하지 않음)
+        patch = self._warp_region(crop, mat if crop_mat is None else crop_mat, bounds)
+        patch[:, :, 3] = self._warp_region(mask, mat, bounds)
+
+        # 실제 알파 영역으로 잘라내기
+        tx, ty, tw, th = self._nonzero_bbox(patch[:, :, 3])
+        if tw == 0:
+            return None, None
+        return patch[ty:ty+th, tx:tx+tw], (bounds[0] + tx, bounds[1] + ty)
+
+    # 변환 결과 중 bounds=(x1, y1, x2, y2) 영역만 계산
+    def _warp_region(self, img, mat, bounds):
+        x1, y1, x2, y2 = bounds
+        roi_mat = mat.copy()
+        roi_mat[0, 2] -= x1
+        roi_mat[1, 2] -= y1
+        return cv2.warpAffine(img, roi_mat, (x2 - x1, y2 - y1),
+                              borderMode=cv2.BORDER_CONSTANT,
+                              borderValue=(0, 0, 0, 0))
+
+    # 사각형 bbox=(x, y, w, h)를 변환했을 때의 경계 (보간 여유 1픽셀 포함, dst_size 내로 제한)
+    # 영역이 없으면 None
+    def _transformed_bounds(self, mat, bbox, dst_size):
+        bx, by, bw, bh = bbox
+        if bw == 0 or bh == 0:
+            return None
+
+        corners = np.array([[bx - 1, by - 1], [bx + bw, by - 1],
+                            [bx - 1, by + bh], [bx + bw, by + bh]], dtype=np.float64)
+        pts = corners @ mat[:, :2].T + mat[:, 2]
+        x1 = max(0, int(np.floor(pts[:, 0].min())))
+        y1 = max(0, int(np.floor(pts[:, 1].min())))
+        x2 = min(dst_size[0], int(np.ceil(pts[:, 0].max())) + 1)
+        y2 = min(dst_size[1], int(np.ceil(pts[:, 1].max())) + 1)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
 
-        rotated = cv2.warpAffine(img, rot_mat, (new_w, new_h), 
-                                borderMode=cv2.BORDER_CONSTANT, 
-                                borderValue=(0, 0, 0, 0))
-        return rotated
+    # 0이 아닌 값의 경계 사각형 (x, y, w, h)
+    def _nonzero_bbox(self, mask):
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size == 0:
+            return 0, 0, 0, 0
+        cols = np.flatnonzero(mask.any(axis=0))
+        return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
 
-    # 랜덤 각도 회전
-    def rotate_random(self, img):
-        angle = random.randint(0, 359)
-        return self.rotate(img, angle)
\ No newline at end of file
+    # 랜덤 각도 회전 (rng: random 모듈 또는 random.Random 객체)
+    def rotate_random(self, img, trim=False, rng=None):
+        angle = (rng or random).randint(0, 359)
+        return self.rotate(img, angle, trim)
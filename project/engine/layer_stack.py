@@ -0,0 +1,265 @@
+import numpy as np
+from engine.layout_manager import LayoutManager
+from engine.compositor import TiledCompositor
+
+# 렌더링된 조각들을 레이어로 유지하면서 조각 하나를 이동/회전/삭제하는 클래스
+# 편집 중인 조각 아래(불투명 캔버스)와 위(under 누적 색/투과율)를 캐시하여 바뀐 영역만 다시 합성
+# 캐시는 타일 단위로 처음 다시 합성하는 영역에만 만들어서 첫 편집도 편집 영역 크기에 비례
+# 레이어는 패치만 보관하고, 다시 변환할 때 필요한 크롭/마스크는 편집 중인 조각만 소스 풀에서 다시 준비
+# 조각 패치를 모두 보관하므로 초안이나 편집할 때만 사용 (한 번에 합성하는 렌더링은 render_recipe)
+# 좌표는 모두 최종 결과(여백 제외) 기준 픽셀
+class LayerStack:
+
+    # recipe를 scale 배율로 렌더링하면서 조각별 패치를 보관
+    # progress(완료 수, 전체 수), cancel_event는 CollageGenerator.render_recipe와 동일
+    def __init__(self, generator, recipe, scale=1.0, progress=None, cancel_event=None):
+        self.generator = generator
+        self.recipe = recipe
+        self.canvas_size, self.margin, self.work_size = generator._scaled_sizes(recipe, scale)
+        cw, ch = self.canvas_size
+        m = self.margin
+        self.visible = (m, m, m + cw, m + ch)
+
+        self.canvas = generator._create_canvas(self.canvas_size, self.margin)
+        layout_manager = LayoutManager(canvas_size=self.work_size)
+        total = len(recipe["pieces"]) + 1
+
+        # 소스 풀은 예산 안에서만 디코딩 결과를 붙잡으므로 편집할 때 다시 쓰도록 유지
+        self.sources = generator._source_pool(recipe["image_paths"], self.work_size)
+        self.sources.preload([piece["source"] for piece in recipe["pieces"]])
+
+        # 조각 레이어: 레시피 항목, 조각 크기, 현재 각도/중심/패치
+        # prepared(크롭 뷰, 마스크)는 소스 전체를 붙잡으므로 편집 중인 조각만 유지
+        self.layers = []
+        for i, piece in enumerate(recipe["pieces"]):
+            generator._check_cancel(cancel_event)
+            prepared = generator._piece_layer(self.sources[piece["source"]], piece, self.work_size)
+            px, py = prepared["position"]
+            pw, ph = prepared["size"]
+            _, full_w, full_h = generator.image_manager.rotation_matrix(pw, ph, piece["angle"])
+
+            layer = {"piece": piece, "prepared": prepared, "size": (pw, ph), "angle": piece["angle"],
+                     "center": (px + full_w / 2, py + full_h / 2), "position": (px, py), "patch": None}
+            self._warp(layer)
+            self._blend(self.canvas, layer, 0, 0)
+            layer["prepared"] = None
+            self.layers.append(layer)
+            if progress is not None:
+                progress(i + 1, total)
+
+        # 메인 이미지는 편집 대상이 아니며 항상 맨 위 (배치 기록기로 최종 좌표 계산)
+        generator._check_cancel(cancel_event)
+        recorder = TiledCompositor(generator.placer)
+        main_image = generator._prepare_main_image(self.sources[0], layout_manager.main_area, recipe["main"])
+        generator._place_main_image(self.canvas, main_image, layout_manager.main_area, recorder)
+        patch, x, y = recorder.placements[0]
+        self.main_layer = {"patch": patch, "x": x, "y": y}
+        self._blend(self.canvas, self.main_layer, 0, 0)
+        if progress is not None:
+            progress(total, total)
+
+        # 편집 중인 조각 번호와 아래/위 캐시 (보이는 영역 크기), 타일별 캐시 준비 여부
+        self.cache_tile = 256
+        self._edit_index = None
+        self._below = None
+        self._above_color = None
+        self._above_trans = None
+        self._cached_tiles = None
+
+    # 현재 결과 (최종 크기 뷰)
+    def result(self):
+        return self.generator._crop_to_final_size(self.canvas, self.canvas_size, self.margin)
+
+    # (x, y) 위치에 보이는 맨 위 조각 번호 (메인 이미지나 빈 곳이면 None)
+    def hit_test(self, x, y):
+        wx, wy = int(x) + self.margin, int(y) + self.margin
+        if self._alpha_at(self.main_layer, wx, wy) > 0:
+            return None
+        for i in range(len(self.layers) - 1, -1, -1):
+            if self._alpha_at(self.layers[i], wx, wy) > 0:
+                return i
+        return None
+
+    # 조각 이동 (편집 메서드는 다시 합성한 결과 좌표 사각형 (x1, y1, x2, y2) 목록 반환)
+    def move(self, index, dx, dy):
+        layer = self.layers[index]
+        cx, cy = layer["center"]
+        return self._edit(index, angle=layer["angle"], center=(cx + dx, cy + dy))
+
+    # 조각 회전 (회전된 사각형 중심 기준)
+    def rotate(self, index, delta):
+        layer = self.layers[index]
+        return self._edit(index, angle=(layer["angle"] + delta) % 360, center=layer["center"])
+
+    # 조각 삭제
+    def delete(self, index):
+        rects = self._edit(index, remove=True)
+        self.end_edit()
+        del self.layers[index]
+        return rects
+
+    # 편집 캐시와 편집 중인 조각의 준비 결과 해제
+    def end_edit(self):
+        if self._edit_index is not None:
+            self.layers[self._edit_index]["prepared"] = None
+        self._edit_index = None
+        self._below = None
+        self._above_color = None
+        self._above_trans = None
+        self._cached_tiles = None
+
+    # 편집 결과를 반영한 레시피 (위치는 작업 캔버스 대비 비율로 다시 기록)
+    def to_recipe(self):
+        work_w, work_h = self.work_size
+        pieces = [dict(layer["piece"], angle=layer["angle"],
+                       position=[layer["position"][0] / work_w, layer["position"][1] / work_h])
+                  for layer in self.layers]
+        return dict(self.recipe, pieces=pieces)
+
+    # 조각 하나 변경 후 이전/새 영역만 다시 합성
+    def _edit(self, index, angle=None, center=None, remove=False):
+        self._begin_edit(index)
+        layer = self.layers[index]
+        rects = [self._layer_rect(layer)]
+
+        if remove:
+            layer["patch"] = None
+        else:
+            pw, ph = layer["size"]
+            _, full_w, full_h = self.generator.image_manager.rotation_matrix(pw, ph, angle)
+            layer["angle"] = angle
+            layer["center"] = center
+            layer["position"] = (int(round(center[0] - full_w / 2)), int(round(center[1] - full_h / 2)))
+            self._warp(layer)
+            rects.append(self._layer_rect(layer))
+
+        rects = self._clip_rects(rects)
+        for rect in rects:
+            self._recomposite(rect, layer)
+
+        m = self.margin
+        return [(x1 - m, y1 - m, x2 - m, y2 - m) for x1, y1, x2, y2 in rects]
+
+    # 편집할 조각의 아래/위 캐시 준비 (같은 조각을 계속 편집하면 재사용)
+    # 버퍼만 잡아 두고 내용은 _ensure_cached가 필요한 타일만 채움, 조각의 크롭/마스크는 레시피와 소스 풀에서 다시 준비
+    def _begin_edit(self, index):
+        if self._edit_index == index:
+            return
+        self.end_edit()
+
+        vx1, vy1, vx2, vy2 = self.visible
+        h, w = vy2 - vy1, vx2 - vx1
+        t = self.cache_tile
+
+        layer = self.layers[index]
+        piece = layer["piece"]
+        layer["prepared"] = self.generator._piece_layer(self.sources[piece["source"]], piece, self.work_size)
+
+        self._edit_index = index
+        self._below = np.empty((h, w, 4), dtype=np.uint8)
+        self._above_color = np.empty((h, w, 3), dtype=np.float32)
+        self._above_trans = np.empty((h, w), dtype=np.float32)
+        self._cached_tiles = np.zeros(((h + t - 1) // t, (w + t - 1) // t), dtype=bool)
+
+    # 작업 캔버스 사각형 영역이 걸치는 타일 중 아직 없는 캐시 채우기
+    def _ensure_cached(self, rect):
+        vx1, vy1 = self.visible[:2]
+        t = self.cache_tile
+        x1, y1, x2, y2 = rect
+        for ty in range((y1 - vy1) // t, (y2 - vy1 - 1) // t + 1):
+            for tx in range((x1 - vx1) // t, (x2 - vx1 - 1) // t + 1):
+                if not self._cached_tiles[ty, tx]:
+                    self._cache_tile(tx, ty)
+                    self._cached_tiles[ty, tx] = True
+
+    # 타일 하나의 아래 캐시(배경 + 아래 조각) 와 위 캐시(메인 이미지부터 아래로 under 누적) 계산
+    def _cache_tile(self, tx, ty):
+        vx1, vy1 = self.visible[:2]
+        t = self.cache_tile
+        cy1, cx1 = ty * t, tx * t
+        cy2, cx2 = min(cy1 + t, self._below.shape[0]), min(cx1 + t, self._below.shape[1])
+        wx1, wy1 = vx1 + cx1, vy1 + cy1
+        tile = (wx1, wy1, vx1 + cx2, vy1 + cy2)
+        index = self._edit_index
+
+        below = self._below[cy1:cy2, cx1:cx2]
+        below[:] = 255
+        for layer in self.layers[:index]:
+            if self._overlaps(layer, tile):
+                self._blend(below, layer, wx1, wy1)
+
+        color = self._above_color[cy1:cy2, cx1:cx2]
+        trans = self._above_trans[cy1:cy2, cx1:cx2]
+        color[:] = 0
+        trans[:] = 1
+        placer = self.generator.placer
+        for layer in [self.main_layer] + self.layers[:index:-1]:
+            if self._overlaps(layer, tile):
+                placer.alpha_under(color, trans, layer["patch"], layer["x"] - wx1, layer["y"] - wy1)
+
+    # 작업 캔버스 사각형 영역 = 아래 캐시 + 편집 조각 + 위 캐시
+    def _recomposite(self, rect, layer):
+        x1, y1, x2, y2 = rect
+        vx1, vy1 = self.visible[:2]
+        cy1, cy2, cx1, cx2 = y1 - vy1, y2 - vy1, x1 - vx1, x2 - vx1
+
+        self._ensure_cached(rect)
+        view = self.canvas[y1:y2, x1:x2]
+        view[:] = self._below[cy1:cy2, cx1:cx2]
+        self._blend(view, layer, x1, y1)
+        self.generator.placer.resolve_under(view, self._above_color[cy1:cy2, cx1:cx2],
+                                            self._above_trans[cy1:cy2, cx1:cx2], opaque_canvas=True)
+
+    # 레이어의 현재 각도/위치로 패치 생성 (캔버스 밖이면 None)
+    def _warp(self, layer):
+        patch, x, y, offset = self.generator._warp_layer(
+            layer["prepared"], layer["angle"], layer["position"], self.work_size)
+        if offset is not None:
+            x += offset[0]
+            y += offset[1]
+        layer["patch"], layer["x"], layer["y"] = patch, x, y
+
+    # 레이어를 캔버스(원점이 작업 캔버스의 (ox, oy)인 배열)에 합성
+    def _blend(self, canvas, layer, ox, oy):
+        if layer["patch"] is not None:
+            self.generator.placer.alpha_blend(canvas, layer["patch"], layer["x"] - ox, layer["y"] - oy,
+                                              opaque_canvas=True)
+
+    # 레이어가 덮는 사각형 (x1, y1, x2, y2), 패치가 없으면 None
+    def _layer_rect(self, layer):
+        patch = layer["patch"]
+        if patch is None:
+            return None
+        return layer["x"], layer["y"], layer["x"] + patch.shape[1], layer["y"] + patch.shape[0]
+
+    # 레이어 패치가 사각형 (x1, y1, x2, y2)와 겹치는지
+    def _overlaps(self, layer, rect):
+        lr = self._layer_rect(layer)
+        return lr is not None and lr[0] < rect[2] and rect[0] < lr[2] and lr[1] < rect[3] and rect[1] < lr[3]
+
+    # 보이는 영역으로 자르고, 겹치는 두 사각형은 하나로 합치기
+    def _clip_rects(self, rects):
+        bx1, by1, bx2, by2 = self.visible
+        clipped = []
+        for rect in rects:
+            if rect is None:
+                continue
+            x1, y1, x2, y2 = max(bx1, rect[0]), max(by1, rect[1]), min(bx2, rect[2]), min(by2, rect[3])
+            if x2 > x1 and y2 > y1:
+                clipped.append((x1, y1, x2, y2))
+
+        if len(clipped) == 2:
+            a, b = clipped
+            if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                return [(min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))]
+        return clipped
+
+    # 작업 캔버스 (x, y) 위치의 레이어 알파 (범위 밖이면 0)
+    def _alpha_at(self, layer, x, y):
+        patch = layer["patch"]
+        if patch is None:
+            return 0
+        px, py = x - layer["x"], y - layer["y"]
+        if 0 <= px < patch.shape[1] and 0 <= py < patch.shape[0]:
+            return int(patch[py, px, 3])
+        return 0
@@ -4,67 +4,134 @@ import random
 # 이미지 마스크 생성 클래스
 class MaskGenerator:
 
+    # bank_size > 0이면 다각형을 설정별로 미리 만들어 두고 요청 크기로 늘려 재사용
+    # bank_resolution: 다각형 생성 시 사용하는 격자 크기, bank_seed: 마스크 뱅크 생성용 시드
+    def __init__(self, bank_size=0, bank_resolution=1024, bank_seed=0):
+        self.bank_size = bank_size
+        self.bank_resolution = bank_resolution
+        self.bank_seed = bank_seed
+
+        # 다각형 설정 키 -> 정규화(0~1) 꼭짓점 배열 목록
+        self._banks = {}
+
     # 메인 이미지용 기본 도형 마스크 생성
     def create_main_mask(self, shape_type, w, h):
         mask = np.zeros((h, w), dtype=np.uint8)
         center = (w//2, h//2)
         radius = min(w, h) // 2
-        cv2.circle(mask, center, radius, 255, -1)      
-            
+        cv2.circle(mask, center, radius, 255, -1)
+
         return mask
 
     # 조각 이미지용 다각형 마스크 생성
-    def create_piece_mask(self, w, h, polygon_config):
-        mask = np.zeros((h, w), dtype=np.uint8)
+    def create_piece_mask(self, w, h, polygon_config, rng=None):
+        shape = self.random_piece_shape(w, h, polygon_config, rng)
+        return self.draw_piece_mask(shape, w, h)
+
+    # 조각 마스크 모양 결정 (크기와 무관한 직렬화 가능 dict, rng: random 모듈 또는 random.Random 객체)
+    # {"type": "rect"} 또는 {"type": "polygon", "points": 0~1 정규화 꼭짓점, "antialias": bool}
+    def random_piece_shape(self, w, h, polygon_config, rng=None):
+        rng = rng or random
 
         # 80% 확률로 다각형 변환
-        if random.random() < 0.8:
-            
-            # 다각형 마스크
-            center_x = w // 2
-            center_y = h // 2
-
-            # polygon_config에서 설정값 가져오기
-            min_vertices = polygon_config.get("min_vertices", 3)
-            max_vertices = polygon_config.get("max_vertices", 8)
-            radius_min = polygon_config.get("radius_min", 0.3)
-            radius_max = polygon_config.get("radius_max", 0.5)
-            noise_ratio = polygon_config.get("noise_ratio", 0.1)
-
-            # 랜덤 꼭짓점의 개수
-            num_vertices = random.randint(min_vertices, max_vertices)
-            
-            points = []
-        
-            for i in range(num_vertices):
-                # 기본 각도 + 노이즈 추가
-                angle = (i / num_vertices) * 2 * np.pi + random.uniform(-0.3, 0.3)
-    
-                # 반지름 랜덤
-                radius_x = w * random.uniform(radius_min, radius_max)
-                radius_y = h * random.uniform(radius_min, radius_max)
-    
-                # 기본 좌표 계산
-                px = int(center_x + np.cos(angle) * radius_x)
-                py = int(center_y + np.sin(angle) * radius_y)
-    
-                # 추가 노이즈
-                px += random.randint(-int(w * noise_ratio), int(w * noise_ratio))
-                py += random.randint(-int(h * noise_ratio), int(h * noise_ratio))
-    
-                # 범위 내로 제한
-                px = max(0, min(w-1, px))
-                py = max(0, min(h-1, py))
-                
-                points.append([px, py])
-    
-            # 다각형 채우기
-            points = np.array(points, dtype=np.int32)
-            cv2.fillPoly(mask, [points], 255)
-    
-            # 가우시안 블러를 통한 경계 처리
-            mask = cv2.GaussianBlur(mask, (3, 3), 0)
-        else:
-            cv2.rectangle(mask, (0, 0), (w, h), 255, -1) 
-        
-        return mask
\ No newline at end of file
+        if rng.random() < 0.8:
+
+            # 마스크 뱅크 사용 시 미리 만든 다각형 재사용
+            if self.bank_size > 0:
+                bank = self._get_bank(polygon_config)
+                points = bank[rng.randrange(len(bank))]
+                return {"type": "polygon", "points": points.tolist(), "antialias": True}
+
+            points = self._random_polygon(w, h, polygon_config, rng)
+            normalized = points / np.array([max(1, w - 1), max(1, h - 1)], dtype=np.float64)
+            return {"type": "polygon", "points": normalized.tolist(), "antialias": False}
+
+        return {"type": "rect"}
+
+    # 모양 정보를 (w, h) 크기의 마스크로 그리기
+    def draw_piece_mask(self, shape, w, h):
+        if shape["type"] == "rect":
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.rectangle(mask, (0, 0), (w, h), 255, -1)
+            return mask
+
+        normalized = np.array(shape["points"], dtype=np.float64)
+        if shape.get("antialias"):
+            return self._draw_normalized_polygon(normalized, w, h)
+
+        # 다각형 채우기
+        mask = np.zeros((h, w), dtype=np.uint8)
+        points = np.round(normalized * np.array([max(1, w - 1), max(1, h - 1)])).astype(np.int32)
+        cv2.fillPoly(mask, [points], 255)
+
+        # 가우시안 블러를 통한 경계 처리
+        mask = cv2.GaussianBlur(mask, (3, 3), 0)
+        return mask
+
+    # 모양 정보의 외곽선 꼭짓점을 (w, h) 크기 조각 좌표로 반환 (float 배열)
+    def shape_outline(self, shape, w, h):
+        if shape["type"] == "rect":
+            return np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float64)
+        return np.array(shape["points"], dtype=np.float64) * np.array([max(1, w - 1), max(1, h - 1)])
+
+    # 랜덤 다각형 꼭짓점 생성 (rng: random 모듈 또는 random.Random 객체)
+    def _random_polygon(self, w, h, polygon_config, rng):
+        # 다각형 중심
+        center_x = w // 2
+        center_y = h // 2
+
+        # polygon_config에서 설정값 가져오기
+        min_vertices = polygon_config.get("min_vertices", 3)
+        max_vertices = polygon_config.get("max_vertices", 8)
+        radius_min = polygon_config.get("radius_min", 0.3)
+        radius_max = polygon_config.get("radius_max", 0.5)
+        noise_ratio = polygon_config.get("noise_ratio", 0.1)
+
+        # 랜덤 꼭짓점의 개수
+        num_vertices = rng.randint(min_vertices, max_vertices)
+
+        points = []
+
+        for i in range(num_vertices):
+            # 기본 각도 + 노이즈 추가
+            angle = (i / num_vertices) * 2 * np.pi + rng.uniform(-0.3, 0.3)
+
+            # 반지름 랜덤
+            radius_x = w * rng.uniform(radius_min, radius_max)
+            radius_y = h * rng.uniform(radius_min, radius_max)
+
+            # 기본 좌표 계산
+            px = int(center_x + np.cos(angle) * radius_x)
+            py = int(center_y + np.sin(angle) * radius_y)
+
+            # 추가 노이즈
+            px += rng.randint(-int(w * noise_ratio), int(w * noise_ratio))
+            py += rng.randint(-int(h * noise_ratio), int(h * noise_ratio))
+
+            # 범위 내로 제한
+            px = max(0, min(w-1, px))
+            py = max(0, min(h-1, py))
+
+            points.append([px, py])
+
+        return np.array(points, dtype=np.int32)
+
+    # 정규화 꼭짓점을 (w, h) 크기로 그리기
+    # 블러 대신 1/16 픽셀 정밀도의 안티앨리어싱으로 경계 처리 (큰 조각에서 블러보다 훨씬 빠름)
+    def _draw_normalized_polygon(self, normalized, w, h):
+        mask = np.zeros((h, w), dtype=np.uint8)
+        points = np.round(normalized * np.array([(w - 1) * 16, (h - 1) * 16])).astype(np.int32)
+        cv2.fillPoly(mask, [points], 255, lineType=cv2.LINE_AA, shift=4)
+        return mask
+
+    # 다각형 설정별 마스크 뱅크 (처음 요청 시 시드 고정으로 생성)
+    def _get_bank(self, polygon_config):
+        key = tuple(sorted(polygon_config.items()))
+        bank = self._banks.get(key)
+        if bank is None:
+            rng = random.Random(self.bank_seed)
+            res = self.bank_resolution
+            bank = [(self._random_polygon(res, res, polygon_config, rng) / (res - 1)).astype(np.float32)
+                    for _ in range(self.bank_size)]
+            self._banks[key] = bank
+        return bank
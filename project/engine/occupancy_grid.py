@@ -0,0 +1,114 @@
+import numpy as np, cv2
+
+# 캔버스 덮임 상태를 거친 격자로 관리하는 클래스 (합산 영역 테이블로 O(1) 조회)
+class OccupancyGrid:
+
+    # canvas_size: 작업 캔버스 크기, visible_rect: 최종 결과에 남는 영역 (x, y, w, h)
+    # 보이지 않는 여백 셀은 처음부터 덮인 것으로 취급
+    def __init__(self, canvas_size, visible_rect=None, cell_size=16):
+        cw, ch = canvas_size
+        self.cell_size = cell_size
+        self.cols = (cw + cell_size - 1) // cell_size
+        self.rows = (ch + cell_size - 1) // cell_size
+
+        # 셀마다 덮인 횟수
+        self.coverage = np.zeros((self.rows, self.cols), dtype=np.int32)
+
+        if visible_rect is not None:
+            vx, vy, vw, vh = visible_rect
+            hidden = np.ones((self.rows, self.cols), dtype=bool)
+            hidden[vy // cell_size:(vy + vh + cell_size - 1) // cell_size,
+                   vx // cell_size:(vx + vw + cell_size - 1) // cell_size] = False
+            self.coverage[hidden] = 1
+
+        self._update()
+
+    # 덮이지 않은 셀 목록과 합산 영역 테이블 전체 계산 (생성 시 한 번)
+    def _update(self):
+        uncovered = self.coverage == 0
+        self._uncovered_cells = np.flatnonzero(uncovered)
+
+        self._sat = np.zeros((self.rows + 1, self.cols + 1), dtype=np.int32)
+        self._sat[1:, 1:] = uncovered.cumsum(axis=0).cumsum(axis=1)
+
+    # 셀 (r0, c0)부터 놓인 cell_mask 영역을 덮임 표시하고, 새로 덮인 셀만큼 목록과 테이블 갱신
+    # 격자 전체를 다시 세지 않고 표시한 사각형 안에서만 누적합 계산
+    def _mark(self, r0, c0, cell_mask):
+        h, w = cell_mask.shape
+        region = self.coverage[r0:r0 + h, c0:c0 + w]
+        newly = (region == 0) & (cell_mask > 0)
+        region += cell_mask
+        if not newly.any():
+            return
+
+        # 새로 덮인 셀 제거 (목록은 정렬 순서 유지)
+        rows, cols = np.nonzero(newly)
+        cells = (rows + r0) * self.cols + (cols + c0)
+        self._uncovered_cells = self._uncovered_cells[~np.isin(self._uncovered_cells, cells)]
+
+        # 합산 영역 테이블: 사각형 안은 누적합만큼, 오른쪽/아래쪽은 사각형 경계 누적값만큼 감소
+        delta = newly.astype(np.int32).cumsum(axis=0).cumsum(axis=1)
+        sat = self._sat
+        r1, c1 = r0 + h, c0 + w
+        sat[r0 + 1:r1 + 1, c0 + 1:c1 + 1] -= delta
+        sat[r1 + 1:, c0 + 1:c1 + 1] -= delta[-1]
+        sat[r0 + 1:r1 + 1, c1 + 1:] -= delta[:, -1:]
+        sat[r1 + 1:, c1 + 1:] -= delta[-1, -1]
+
+    # 셀 좌표 사각형 [r0, r1) x [c0, c1)을 격자 안으로 자르기 (비면 None)
+    def _clip_cells(self, r0, c0, r1, c1):
+        r0, c0 = max(0, r0), max(0, c0)
+        r1, c1 = min(self.rows, r1), min(self.cols, c1)
+        if r1 <= r0 or c1 <= c0:
+            return None
+        return r0, c0, r1, c1
+
+    # 덮이지 않은 셀 수
+    def uncovered_count(self):
+        return len(self._uncovered_cells)
+
+    # 덮이지 않은 셀 하나를 랜덤 선택하여 중심 픽셀 좌표 반환 (없으면 None)
+    def random_uncovered_point(self, rng):
+        if len(self._uncovered_cells) == 0:
+            return None
+        cell = int(self._uncovered_cells[rng.randrange(len(self._uncovered_cells))])
+        row, col = divmod(cell, self.cols)
+        half = self.cell_size // 2
+        return col * self.cell_size + half, row * self.cell_size + half
+
+    # 픽셀 사각형 (x, y, w, h)에 걸친 셀 중 덮이지 않은 셀 수 (O(1))
+    def uncovered_in_rect(self, x, y, w, h):
+        cs = self.cell_size
+        c0 = min(self.cols, max(0, x // cs))
+        r0 = min(self.rows, max(0, y // cs))
+        c1 = min(self.cols, max(0, (x + w + cs - 1) // cs))
+        r1 = min(self.rows, max(0, (y + h + cs - 1) // cs))
+        sat = self._sat
+        return int(sat[r1, c1] - sat[r0, c1] - sat[r1, c0] + sat[r0, c0])
+
+    # 픽셀 좌표 다각형이 덮는 셀 표시 (다각형을 감싸는 셀 사각형에만 그림)
+    def mark_polygon(self, points):
+        cell_points = np.round(np.asarray(points, dtype=np.float64) / self.cell_size - 0.5).astype(np.int32)
+        (c0, r0), (c1, r1) = cell_points.min(axis=0), cell_points.max(axis=0) + 1
+        box = self._clip_cells(r0, c0, r1, c1)
+        if box is None:
+            return
+        r0, c0, r1, c1 = box
+
+        cell_mask = np.zeros((r1 - r0, c1 - c0), dtype=np.uint8)
+        cv2.fillPoly(cell_mask, [cell_points - (c0, r0)], 1)
+        self._mark(r0, c0, cell_mask)
+
+    # 픽셀 좌표 원이 덮는 셀 표시 (메인 이미지 영역)
+    def mark_circle(self, center, radius):
+        cx = int(round(center[0] / self.cell_size - 0.5))
+        cy = int(round(center[1] / self.cell_size - 0.5))
+        r = max(0, int(radius / self.cell_size))
+        box = self._clip_cells(cy - r, cx - r, cy + r + 1, cx + r + 1)
+        if box is None:
+            return
+        r0, c0, r1, c1 = box
+
+        cell_mask = np.zeros((r1 - r0, c1 - c0), dtype=np.uint8)
+        cv2.circle(cell_mask, (cx - c0, cy - r0), r, 1, -1)
+        self._mark(r0, c0, cell_mask)
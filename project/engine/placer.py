@@ -4,8 +4,21 @@ import random
 # 이미지 배치 및 합성 클래스
 class Placer:
 
-    # 알파 블렌딩으로 이미지를 합성
-    def alpha_blend(self, canvas, patch, x, y):
+    # 이 값보다 투과율이 작으면 이후 층은 결과에 0.5 단계 미만 영향 (불투명으로 취급)
+    OPAQUE_EPS = 0.5 / 255
+
+    # alpha_blend가 한 번에 처리하는 최대 픽셀 수 (행 단위 띠로 나눔)
+    # 픽셀당 uint16 임시 배열 약 20바이트이므로 패치 크기와 관계없이 약 20MB 이내
+    BLEND_STRIP_PIXELS = 1024 * 1024
+
+    # 알파 블렌딩으로 이미지를 합성 (uint16 고정소수점, 캔버스 영역에 직접 기록)
+    # opaque_canvas=True이면 캔버스가 불투명하다고 보고 알파 채널 합성 생략
+    # offset=(ox, oy)는 잘라낸 패치의 원래 사각형 내 위치 (ImageManager.rotate의 trim 결과)
+    def alpha_blend(self, canvas, patch, x, y, opaque_canvas=False, offset=None):
+        if offset is not None:
+            x += offset[0]
+            y += offset[1]
+
         ch, cw = canvas.shape[:2]
         ph, pw = patch.shape[:2]
 
@@ -17,53 +30,144 @@ class Placer:
         px1 = x1 - x
         py1 = y1 - y
         px2 = px1 + (x2 - x1)
-        py2 = py1 + (y2 - y1)
 
         # 영역 밖이면 리턴
         if x2 <= x1 or y2 <= y1:
             return
 
-        # 합성할 영역 추출
-        canvas_region = canvas[y1:y2, x1:x2]
-        patch_region = patch[py1:py2, px1:px2]
+        # 큰 패치도 임시 배열 크기가 일정하도록 행 단위 띠로 나눠서 합성 (캔버스 쪽은 뷰)
+        rows = max(1, self.BLEND_STRIP_PIXELS // (x2 - x1))
+        for sy in range(0, y2 - y1, rows):
+            sh = min(rows, y2 - y1 - sy)
+            self._blend_region(canvas[y1 + sy:y1 + sy + sh, x1:x2],
+                               patch[py1 + sy:py1 + sy + sh, px1:px2], opaque_canvas)
+
+    # 같은 크기의 캔버스 영역(뷰)에 패치 영역을 알파 블렌딩
+    def _blend_region(self, canvas_region, patch_region, opaque_canvas):
+        # 알파와 (255 - 알파)를 uint16으로 준비
+        alpha = patch_region[:, :, 3:4].astype(np.uint16)
+        inv_alpha = 255 - alpha
+
+        # 알파 블렌딩: (패치 * a + 캔버스 * (255 - a)) / 255, 최댓값 65025로 uint16 범위 내
+        # 채널을 나누지 않고 4채널 전체를 한 번에 계산 (연속 메모리 접근)
+        acc = np.multiply(patch_region, alpha, dtype=np.uint16)
+        acc += np.multiply(canvas_region, inv_alpha, dtype=np.uint16)
+        self._div255(acc)
+
+        # 알파 채널: 불투명 캔버스는 그대로 255, 아니면 a + 캔버스 알파 * (255 - a) / 255
+        if opaque_canvas:
+            acc[:, :, 3] = 255
+        else:
+            canvas_alpha = np.multiply(canvas_region[:, :, 3:4], inv_alpha, dtype=np.uint16)
+            acc[:, :, 3:4] = alpha + self._div255(canvas_alpha)
+
+        # 캔버스 영역에 기록
+        np.copyto(canvas_region, acc, casting="unsafe")
+
+    # 앞에서 뒤로 합성할 때 쓰는 under 연산 (패치를 지금까지 누적된 결과의 아래에 깔기)
+    # color: 프리멀티플라이 누적 색 (h, w, 3) float32, trans: 남은 투과율 (h, w) float32, 둘 다 제자리 갱신
+    # 이미 불투명해진 (투과율 < OPAQUE_EPS) 픽셀 바깥쪽 행/열은 계산하지 않음
+    def alpha_under(self, color, trans, patch, x, y):
+        ch, cw = trans.shape
+        ph, pw = patch.shape[:2]
+
+        # 누적 버퍼 경계 내로 제한
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(cw, x + pw), min(ch, y + ph)
+        if x2 <= x1 or y2 <= y1:
+            return
 
-        # 알파 채널 추출 및 정규화
-        alpha = patch_region[:, :, 3:4].astype(np.float32) / 255.0
+        # 아직 빛이 통과하는 픽셀만 감싸는 영역으로 축소 (완전히 가려진 패치는 건너뜀)
+        live = trans[y1:y2, x1:x2] >= self.OPAQUE_EPS
+        rows = np.flatnonzero(live.any(axis=1))
+        if len(rows) == 0:
+            return
+        cols = np.flatnonzero(live.any(axis=0))
+        y1, y2 = y1 + rows[0], y1 + rows[-1] + 1
+        x1, x2 = x1 + cols[0], x1 + cols[-1] + 1
+
+        t = trans[y1:y2, x1:x2]
+        patch_region = patch[y1 - y:y2 - y, x1 - x:x2 - x]
+
+        # 기여도 = 패치 알파 * 남은 투과율
+        weight = patch_region[:, :, 3] * (t / 255)
+        color[y1:y2, x1:x2] += patch_region[:, :, :3] * weight[:, :, None]
+        t -= weight
+
+    # under 누적 결과를 캔버스 위에 확정 (캔버스가 가장 아래 층)
+    def resolve_under(self, canvas, color, trans, opaque_canvas=False):
+        out = color + canvas[:, :, :3] * trans[:, :, None]
+        np.copyto(canvas[:, :, :3], out + 0.5, casting="unsafe")
+
+        if opaque_canvas:
+            canvas[:, :, 3] = 255
+        else:
+            alpha = 255 * (1 - trans) + canvas[:, :, 3] * trans
+            np.copyto(canvas[:, :, 3], alpha + 0.5, casting="unsafe")
+
+    # 0~65025 범위 uint16 값을 255로 나눈 반올림 값 (제자리 연산)
+    def _div255(self, v):
+        v += 128
+        v += v >> 8
+        v >>= 8
+        return v
+
+    # 메인 영역을 피해 랜덤 배치 위치 탐색 (rng: random 모듈 또는 random.Random 객체)
+    def random_position_avoid_main(self, canvas_size, patch_size, main_area, rng=None):
+        rng = rng or random
+        cw, ch = canvas_size
+        pw, ph = patch_size
 
-        # 알파 블렌딩
-        blended = (patch_region[:, :, :3].astype(np.float32) * alpha +
-                   canvas_region[:, :, :3].astype(np.float32) * (1 - alpha))
+        for _ in range(50):  # 배치 영역 최대 50번 탐색
+            rx = rng.randint(0, max(0, cw - pw))
+            ry = rng.randint(0, max(0, ch - ph))
 
-        # RGB 채널 적용
-        canvas[y1:y2, x1:x2, :3] = blended.astype(np.uint8)
+            # 겹침이 30% 미만이면 좌표값 리턴
+            if self._main_overlap(rx, ry, pw, ph, main_area) < 0.3 * (pw * ph):
+                return rx, ry
 
-        # 알파 채널 합성
-        canvas_alpha = canvas_region[:, :, 3:4].astype(np.float32) / 255.0
-        new_alpha = alpha + canvas_alpha * (1 - alpha)
-        canvas[y1:y2, x1:x2, 3:4] = (new_alpha * 255).astype(np.uint8)
+        # 실패 시 아무 위치에 반환 
+        return rng.randint(0, max(0, cw - pw)), rng.randint(0, max(0, ch - ph))
 
-    # 메인 영역을 피해 랜덤 배치 위치 탐색
-    def random_position_avoid_main(self, canvas_size, patch_size, main_area):
+    # 덮임 격자(OccupancyGrid)에서 덮이지 않은 곳을 골라 배치 위치 결정
+    # 덮이지 않은 셀 주변 후보 중 새로 덮는 셀이 가장 많은 위치 선택 (후보당 O(1) 조회)
+    # 메인 영역 겹침 30% 제한을 만족하는 후보가 없으면 random_position_avoid_main으로 대체
+    def grid_position_avoid_main(self, grid, canvas_size, patch_size, main_area, rng=None, candidates=8):
+        rng = rng or random
         cw, ch = canvas_size
         pw, ph = patch_size
 
+        best = None
+        best_score = -1
+        for _ in range(candidates):
+            point = grid.random_uncovered_point(rng)
+            if point is None:
+                break
+
+            # 셀 중심에 패치 중심을 맞추고 조각 크기의 1/4 이내로 흔들기
+            jx = rng.randint(-(pw // 4), pw // 4)
+            jy = rng.randint(-(ph // 4), ph // 4)
+            rx = min(max(0, point[0] - pw // 2 + jx), max(0, cw - pw))
+            ry = min(max(0, point[1] - ph // 2 + jy), max(0, ch - ph))
+
+            if self._main_overlap(rx, ry, pw, ph, main_area) >= 0.3 * (pw * ph):
+                continue
+
+            score = grid.uncovered_in_rect(rx, ry, pw, ph)
+            if score > best_score:
+                best, best_score = (rx, ry), score
+
+        if best is None:
+            return self.random_position_avoid_main(canvas_size, patch_size, main_area, rng)
+        return best
+
+    # 메인 영역과의 교집합 면적
+    def _main_overlap(self, rx, ry, pw, ph, main_area):
         mx = main_area["x"]
         my = main_area["y"]
         mw = main_area["width"]
         mh = main_area["height"]
 
-        for _ in range(50):  # 배치 영역 최대 50번 탐색
-            rx = random.randint(0, max(0, cw - pw))
-            ry = random.randint(0, max(0, ch - ph))
-
-            # 메인 영역과의 교집합 계산
-            inter_w = max(0, min(rx + pw, mx + mw) - max(rx, mx))
-            inter_h = max(0, min(ry + ph, my + mh) - max(ry, my))
-            inter_area = inter_w * inter_h
-
-            # 겹침이 30% 미만이면 좌표값 리턴
-            if inter_area < 0.3 * (pw * ph):
-                return rx, ry
-
-        # 실패 시 아무 위치에 반환 
-        return random.randint(0, max(0, cw - pw)), random.randint(0, max(0, ch - ph))
\ No newline at end of file
+        inter_w = max(0, min(rx + pw, mx + mw) - max(rx, mx))
+        inter_h = max(0, min(ry + ph, my + mh) - max(ry, my))
+        return inter_w * inter_h
@@ -0,0 +1,53 @@
+import cv2
+
+# 미리보기용 축소 피라미드 (각 단계는 이전 단계의 2x2 평균, 원본은 복사하지 않음)
+# 창 크기에 맞는 미리보기는 가장 가까운 큰 단계에서 축소하여 만듦
+class PreviewPyramid:
+
+    # img: BGRA 원본 (뷰로 보관하므로 원본이 바뀌면 update로 알려야 함)
+    # min_size: 이보다 작은 단계는 만들지 않음 (짧은 변 기준)
+    def __init__(self, img, min_size=64):
+        self.levels = [img]
+        while min(self.levels[-1].shape[:2]) // 2 >= min_size:
+            self.levels.append(self._half(self.levels[-1]))
+
+    # 원본 크기 (w, h)
+    def size(self):
+        h, w = self.levels[0].shape[:2]
+        return w, h
+
+    # (width, height) 크기의 RGBA 미리보기 생성
+    def render(self, width, height):
+        level = self._nearest_level(width, height)
+        if level.shape[1] != width or level.shape[0] != height:
+            level = cv2.resize(level, (width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(level, cv2.COLOR_BGRA2RGBA)
+
+    # 원본의 rect=(x1, y1, x2, y2) 영역이 바뀌었을 때 상위 단계의 해당 영역만 다시 계산
+    def update(self, rect):
+        x1, y1, x2, y2 = rect
+        for k in range(1, len(self.levels)):
+            lower, level = self.levels[k - 1], self.levels[k]
+            h, w = level.shape[:2]
+
+            # 2x2 블록 단위로 확장한 이번 단계 좌표
+            x1, y1 = x1 // 2, y1 // 2
+            x2, y2 = min(w, (x2 + 1) // 2), min(h, (y2 + 1) // 2)
+            if x2 <= x1 or y2 <= y1:
+                return
+
+            block = lower[y1 * 2:y2 * 2, x1 * 2:x2 * 2]
+            level[y1:y2, x1:x2] = cv2.resize(block, (x2 - x1, y2 - y1), interpolation=cv2.INTER_AREA)
+
+    # 요청 크기 이상인 단계 중 가장 작은 단계
+    def _nearest_level(self, width, height):
+        for level in reversed(self.levels):
+            if level.shape[1] >= width and level.shape[0] >= height:
+                return level
+        return self.levels[0]
+
+    # 2x2 평균으로 절반 크기 (홀수 끝 행/열은 버림)
+    def _half(self, img):
+        h, w = img.shape[:2]
+        h2, w2 = h // 2, w // 2
+        return cv2.resize(img[:h2 * 2, :w2 * 2], (w2, h2), interpolation=cv2.INTER_AREA)
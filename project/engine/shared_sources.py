@@ -0,0 +1,135 @@
+import os
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from engine.image_manager import ImageManager
+
+# 공유 소스 키 (절대 경로, 목표 크기 또는 None), ImageManager.load(path, target_size)와 같은 결과를 가리킴
+def source_key(path, target_size=None):
+    return os.path.abspath(path), tuple(target_size) if target_size is not None else None
+
+
+# 부모 프로세스에서 소스를 한 번만 디코딩하여 공유 메모리에 올리는 저장소
+# 작업마다 acquire/release로 참조 수를 관리하고, 더 이상 쓰는 작업이 없으면 바로 해제
+class SharedSourceStore:
+
+    # image_manager: 디코딩에 사용 (공유 메모리로 복사하므로 캐시 없이 생성)
+    def __init__(self, image_manager=None):
+        self.image_manager = image_manager or ImageManager(cache_bytes=0)
+        self.current_bytes = 0
+
+        # 키 -> {"shm", "descriptor", "refs", "bytes"}
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    # 키 목록의 참조 수를 늘리고 워커에 넘길 설명 목록 반환 (없는 소스는 디코딩하여 공유 메모리에 올림)
+    def acquire(self, keys):
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            self._publish([key for key in keys if key not in self._segments])
+            for key in keys:
+                self._segments[key]["refs"] += 1
+            return [self._segments[key]["descriptor"] for key in keys]
+
+    # 키 목록의 참조 수를 줄이고 0이 되면 공유 메모리 해제
+    def release(self, keys):
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                segment = self._segments.get(key)
+                if segment is None:
+                    continue
+                segment["refs"] -= 1
+                if segment["refs"] <= 0:
+                    self._free(key)
+
+    # 남은 공유 메모리 모두 해제
+    def close(self):
+        with self._lock:
+            for key in list(self._segments):
+                self._free(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # 목표 크기별로 묶어서 디코딩 후 공유 메모리로 복사
+    # 디코딩 결과를 한꺼번에 들고 있지 않도록 동시 디코딩 수만큼씩 처리
+    def _publish(self, keys):
+        groups = {}
+        for path, target_size in keys:
+            groups.setdefault(target_size, []).append(path)
+
+        step = max(1, self.image_manager.load_workers)
+        for target_size, paths in groups.items():
+            for i in range(0, len(paths), step):
+                chunk = paths[i:i + step]
+                images = self.image_manager.load_multiple(chunk, target_size)
+                for path, img in zip(chunk, images):
+                    self._put((path, target_size), img)
+
+    # 이미지 하나를 공유 메모리에 복사
+    def _put(self, key, img):
+        shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+        view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+        view[...] = img
+        del view
+
+        descriptor = {"key": key, "name": shm.name, "shape": img.shape, "dtype": img.dtype.str}
+        self._segments[key] = {"shm": shm, "descriptor": descriptor, "refs": 0, "bytes": img.nbytes}
+        self.current_bytes += img.nbytes
+
+    # 공유 메모리 해제 (이미 붙어 있는 워커의 매핑은 워커가 닫을 때까지 유지됨)
+    def _free(self, key):
+        segment = self._segments.pop(key)
+        shm = segment["shm"]
+        self.current_bytes -= segment["bytes"]
+        shm.close()
+        shm.unlink()
+
+
+# 워커 프로세스에서 공유 메모리 소스를 복사 없이 읽기 전용 배열로 여는 클래스
+# 프로세스마다 하나를 유지하며, 다음 작업에서 쓰지 않는 소스는 참조가 사라지면 닫음
+class SharedSourceViews:
+
+    def __init__(self):
+        # 공유 메모리 이름 -> SharedMemory
+        self._handles = {}
+
+    # 설명 목록을 열어서 {키: 배열} 반환 (ImageManager.shared_images에 넣어서 사용)
+    def attach(self, descriptors):
+        images = {}
+        for descriptor in descriptors:
+            name = descriptor["name"]
+            shm = self._handles.get(name)
+            if shm is None:
+                shm = self._open(name)
+                self._handles[name] = shm
+
+            img = np.ndarray(tuple(descriptor["shape"]), dtype=np.dtype(descriptor["dtype"]), buffer=shm.buf)
+            img.flags.writeable = False
+            key = descriptor["key"]
+            images[source_key(key[0], key[1])] = img
+        return images
+
+    # 이번 작업에서 쓰지 않는 공유 메모리 닫기 (keep: 유지할 설명 목록)
+    # 아직 배열이 남아 있으면 닫을 수 없으므로 다음 기회로 미룸
+    def detach_unused(self, keep=()):
+        names = {descriptor["name"] for descriptor in keep}
+        for name in list(self._handles):
+            if name in names:
+                continue
+            try:
+                self._handles[name].close()
+            except BufferError:
+                continue
+            del self._handles[name]
+
+    # 이름으로 공유 메모리 열기 (해제는 만든 부모 프로세스가 담당하므로 추적하지 않음)
+    def _open(self, name):
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python 3.13 미만: 부모와 같은 resource tracker에 등록되며, 부모의 unlink가 등록을 해제함
+            return shared_memory.SharedMemory(name=name)
@@ -0,0 +1,110 @@
+import os
+from collections import OrderedDict
+
+# 소스 이미지 지연 로딩 풀 (처음 사용할 때 디코딩, 개수/바이트 예산을 넘으면 오래된 것부터 해제)
+# 수천 개 경로도 경로 목록만 들고 있으며, 크기는 가능하면 JPEG 헤더로만 계산
+# image_manager의 디코딩 캐시는 별도 예산이므로, 전체 보관량을 묶으려면 캐시 예산도 같이 맞춰야 함
+# (CollageGenerator는 캐시 예산을 pool_max_bytes로 맞춤)
+class SourcePool:
+
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+    # image_manager: 실제 디코딩 (ImageManager.load), target_size: 축소 디코딩 목표 크기
+    # max_images / max_bytes: 풀이 붙잡아 두는 디코딩 이미지 수와 바이트 상한
+    def __init__(self, image_manager, paths, target_size=None, max_images=32, max_bytes=256 * 1024 * 1024):
+        self.image_manager = image_manager
+        self.paths = list(paths)
+        self.target_size = target_size
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+
+        # 번호 -> 디코딩 이미지 (뒤쪽일수록 최근 사용), 번호 -> (높이, 폭)
+        self._images = OrderedDict()
+        self._shapes = {}
+
+    # 폴더 안의 이미지 파일 경로 목록 (이름 순, recursive=True이면 하위 폴더 포함)
+    @classmethod
+    def list_folder(cls, folder, recursive=True):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"폴더를 찾을 수 없습니다: {folder}")
+
+        paths = []
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files)
+                         if name.lower().endswith(cls.IMAGE_EXTENSIONS))
+            if not recursive:
+                break
+        return paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    # index번 이미지 (처음 사용 시 디코딩)
+    def __getitem__(self, index):
+        img = self._images.get(index)
+        if img is not None:
+            self._images.move_to_end(index)
+            return img
+
+        img = self.image_manager.load(self.paths[index], self.target_size)
+        self._keep(index, img)
+        return img
+
+    # index번 이미지의 (높이, 폭), 디코딩하지 않고 알 수 있으면 디코딩 생략
+    def shape(self, index):
+        shape = self._shapes.get(index)
+        if shape is None:
+            size = self.image_manager.decoded_size(self.paths[index], self.target_size)
+            if size is None:
+                shape = self[index].shape[:2]
+            else:
+                shape = (size[1], size[0])
+            self._shapes[index] = shape
+        return shape
+
+    # 곧 사용할 이미지들을 병렬로 미리 디코딩 (예산 안에 들어가는 만큼만, 나머지는 사용 시 디코딩)
+    # 헤더로 크기를 알 수 있으면 미리 예산을 따지고, 모르면 동시 디코딩 수만큼씩 읽으며 예산을 넘으면 중단
+    def preload(self, indices):
+        pending = []
+        expected = 0
+        for i in dict.fromkeys(indices):
+            if len(pending) >= self.max_images:
+                break
+            if i in self._images:
+                continue
+            size = self.image_manager.decoded_size(self.paths[i], self.target_size)
+            if size is not None:
+                if pending and expected + size[0] * size[1] * 4 > self.max_bytes:
+                    break
+                expected += size[0] * size[1] * 4
+            pending.append(i)
+
+        loaded = []
+        loaded_bytes = 0
+        step = max(1, self.image_manager.load_workers)
+        for start in range(0, len(pending), step):
+            chunk = pending[start:start + step]
+            images = self.image_manager.load_multiple([self.paths[i] for i in chunk], self.target_size)
+            loaded.extend(zip(chunk, images))
+            loaded_bytes += sum(img.nbytes for img in images)
+            if loaded_bytes >= self.max_bytes:
+                break
+
+        # 먼저 쓸 이미지가 가장 최근 항목이 되도록 역순으로 보관 (예산 초과 시 나중 것부터 해제)
+        for index, img in reversed(loaded):
+            self._keep(index, img)
+
+    # 디코딩 결과 보관 후 예산 초과분 해제 (방금 넣은 이미지는 유지)
+    def _keep(self, index, img):
+        if index in self._images:
+            self.current_bytes -= self._images.pop(index).nbytes
+        self._images[index] = img
+        self._shapes[index] = img.shape[:2]
+        self.current_bytes += img.nbytes
+
+        while len(self._images) > 1 and (len(self._images) > self.max_images or
+                                         self.current_bytes > self.max_bytes):
+            _, oldest = self._images.popitem(last=False)
+            self.current_bytes -= oldest.nbytes
@@ -0,0 +1,110 @@
+import json
+import time
+import numpy as np
+from contextlib import contextmanager, nullcontext
+
+# 콜라주 생성 단계별 계측 기록 클래스 (CollageGenerator.generate/render_recipe의 stats 인자)
+# 단계: plan, decode, canvas, mask, warp, blend, main, composite, crop
+# 병렬/앞->뒤 합성 시 조각의 blend는 기록만 하고 실제 합성 시간은 composite에 포함
+class RenderStats:
+
+    def __init__(self):
+        # 단계 이름 -> {"seconds": 누적 시간, "calls": 호출 수}
+        self.stages = {}
+
+        # 조각별 기록 (index, 단계별 시간, 합성 면적, 투명 픽셀 수)
+        self.pieces = []
+
+        self.bytes_allocated = 0
+        self.blended_pixels = 0
+        self.transparent_pixels = 0
+
+        self._piece = None
+
+    # 단계 시간 측정 (with 블록), 조각 기록 중이면 해당 조각에도 누적
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += elapsed
+            stage["calls"] += 1
+            if self._piece is not None:
+                self._piece["stages"][name] = self._piece["stages"].get(name, 0.0) + elapsed
+
+    # 조각 하나의 기록 시작
+    def begin_piece(self, index):
+        self._piece = {"index": index, "stages": {}, "blended_pixels": 0, "transparent_pixels": 0}
+
+    # 조각 하나의 기록 종료
+    def end_piece(self):
+        if self._piece is not None:
+            self.pieces.append(self._piece)
+            self._piece = None
+
+    # 새로 할당한 배열 크기 기록
+    def add_allocation(self, nbytes):
+        self.bytes_allocated += int(nbytes)
+
+    # 합성하는 BGRA 패치의 면적과 알파 0 픽셀 수 기록
+    def add_blend(self, patch):
+        pixels = patch.shape[0] * patch.shape[1]
+        transparent = pixels - int(np.count_nonzero(patch[:, :, 3]))
+
+        self.blended_pixels += pixels
+        self.transparent_pixels += transparent
+        if self._piece is not None:
+            self._piece["blended_pixels"] += pixels
+            self._piece["transparent_pixels"] += transparent
+
+    # 합성 면적 중 완전 투명 픽셀 비율
+    def transparent_ratio(self):
+        return self.transparent_pixels / self.blended_pixels if self.blended_pixels else 0.0
+
+    # 전체 소요 시간 (단계 합)
+    def total_seconds(self):
+        return sum(s["seconds"] for s in self.stages.values())
+
+    # JSON 직렬화 가능한 dict
+    def to_dict(self):
+        return {
+            "total_seconds": self.total_seconds(),
+            "stages": self.stages,
+            "bytes_allocated": self.bytes_allocated,
+            "blended_pixels": self.blended_pixels,
+            "transparent_ratio": self.transparent_ratio(),
+            "pieces": self.pieces
+        }
+
+    # JSON 문자열 반환, path가 있으면 파일로도 저장
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+
+# 계측하지 않을 때 쓰는 빈 기록 객체 (RenderStats와 같은 메서드, 아무것도 하지 않음)
+class NullStats:
+
+    def stage(self, name):
+        return nullcontext()
+
+    def begin_piece(self, index):
+        pass
+
+    def end_piece(self):
+        pass
+
+    def add_allocation(self, nbytes):
+        pass
+
+    def add_blend(self, patch):
+        pass
+
+
+NULL_STATS = NullStats()
@@ -1,8 +1,14 @@
+import os
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import numpy as np, cv2
+import queue
+import threading
 from PIL import Image, ImageTk
-from engine.collage_generator import CollageGenerator
+from engine.collage_generator import CollageGenerator, GenerationCancelled
+from engine.layer_stack import LayerStack
+from engine.preview_pyramid import PreviewPyramid
+from engine.source_pool import SourcePool
+from engine.exporter import ResultExporter
 
 # 메인 UI 클래스
 class MainWindow:
@@ -14,19 +20,33 @@ class MainWindow:
         self.image_paths = []
         self.generator = CollageGenerator()
 
+        # 결과 저장 (백그라운드 인코딩), 진행 중인 저장 작업 목록 [(Future, 설명)]
+        self.exporter = ResultExporter()
+        self._exports = []
+
+        # 백그라운드 생성 상태 (작업 스레드 -> UI 스레드 이벤트 큐)
+        self._worker = None
+        self._cancel_event = None
+        self._events = queue.Queue()
+
         self._create_menu()
         self._create_layout()
 
+        # 창을 닫을 때도 진행 중인 저장을 마치고 종료
+        self.root.protocol("WM_DELETE_WINDOW", self._quit)
+
     def _create_menu(self):
         menubar = tk.Menu(self.root)
 
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="이미지 불러오기", command=self._open_files)
+        file_menu.add_command(label="폴더 불러오기", command=self._open_folder)
         file_menu.add_command(label="초기화", command=self._clear_selection)
         file_menu.add_separator()
         file_menu.add_command(label="프로젝트 저장(결과 PNG)", command=self._save_result)
+        file_menu.add_command(label="여러 형식으로 내보내기(PNG/JPG/WebP + 썸네일)", command=self._export_all)
         file_menu.add_separator()
-        file_menu.add_command(label="종료", command=self.root.destroy)
+        file_menu.add_command(label="종료", command=self._quit)
         menubar.add_cascade(label="파일", menu=file_menu)
 
         run_menu = tk.Menu(menubar, tearoff=0)
@@ -71,11 +91,26 @@ class MainWindow:
         self.canvas_h = tk.IntVar(value=600)
         tk.Entry(opt, textvariable=self.canvas_h, width=8).grid(row=2, column=1, padx=5)
 
+        # 초안 배율 (1보다 작으면 작은 초안을 먼저 만들고 '최종 렌더링'으로 원래 크기 생성)
+        tk.Label(opt, text="초안 배율:", bg="lightgray", width=10, anchor="w").grid(row=3, column=0, pady=2)
+        self.draft_scale = tk.DoubleVar(value=1.0)
+        tk.Entry(opt, textvariable=self.draft_scale, width=8).grid(row=3, column=1, padx=5)
+
         # 버튼들
         btn_frame = tk.Frame(left, bg="lightgray")
         btn_frame.pack(padx=10, pady=10)
         tk.Button(btn_frame, text="이미지 불러오기", command=self._open_files, width=15).pack(side="left", padx=(0,5))
         tk.Button(btn_frame, text="콜라주 생성", command=self._generate_collage, width=15).pack(side="left")
+        tk.Button(left, text="최종 렌더링", command=self._render_final, width=32).pack(padx=10)
+
+        # 생성 진행 상황 및 취소
+        progress_frame = tk.Frame(left, bg="lightgray")
+        progress_frame.pack(padx=10, pady=(0, 10))
+        self.progress_label = tk.Label(progress_frame, text="", bg="lightgray", width=22, anchor="w")
+        self.progress_label.pack(side="left")
+        self.cancel_button = tk.Button(progress_frame, text="취소", command=self._cancel_generation,
+                                       width=8, state="disabled")
+        self.cancel_button.pack(side="left")
 
         # 미리보기 영역
         self.preview_frame = tk.Frame(self.root, bg="white")
@@ -84,7 +119,27 @@ class MainWindow:
                                    font=("Arial", 14), fg="gray")
         self.info_label.pack(expand=True)
 
+        # 창 크기가 바뀌면 미리보기 피라미드에서 다시 그림
+        self.preview_frame.bind("<Configure>", self._on_preview_resize)
+
         self.last_result = None
+
+        # 마지막 결과의 레시피와 렌더링 배율 (배율 < 1이면 초안)
+        self.last_recipe = None
+        self.last_scale = 1.0
+
+        # 미리보기: 라벨 하나와 Tk 이미지를 재사용, 결과의 축소 피라미드 캐시
+        self.preview_label = None
+        self.preview_scale = 1.0
+        self.preview_pyramid = None
+        self.tkimg = None
+        self._preview_size = None
+        self._resize_job = None
+
+        # 조각 편집: 레이어 스택 (처음 편집할 때 생성), 선택된 조각, 드래그 위치
+        self.layer_stack = None
+        self._selected_piece = None
+        self._drag_from = None
     
     def _create_label(self, parent, text, bold=False, top_padding=10):
         font = ("Arial", 11, "bold") if bold else ("Arial", 11)
@@ -104,6 +159,23 @@ class MainWindow:
             self._update_image_lists()
             self.info_label.config(text=f"{len(self.image_paths)}개 이미지 선택됨")
     
+    # 폴더 안의 이미지 전체 추가 (하위 폴더 포함, 디코딩은 생성 시 사용하는 이미지만)
+    def _open_folder(self):
+        folder = filedialog.askdirectory(title="이미지 폴더 선택")
+        if not folder:
+            return
+
+        try:
+            paths = SourcePool.list_folder(folder)
+        except OSError as e:
+            messagebox.showerror("오류", f"폴더 읽기 실패:\n{e}")
+            return
+
+        known = set(self.image_paths)
+        self.image_paths.extend(p for p in paths if p not in known)
+        self._update_image_lists()
+        self.info_label.config(text=f"{len(self.image_paths)}개 이미지 선택됨")
+
     def _update_image_lists(self):
         # 메인 이미지 (첫 번째)
         if self.image_paths:
@@ -122,8 +194,14 @@ class MainWindow:
         self._update_image_lists()
         self.info_label.config(text="선택 초기화됨")
         self.last_result = None
+        self.preview_pyramid = None
+        self.last_recipe = None
+        self._reset_editing()
 
     def _generate_collage(self):
+        if self._worker is not None:
+            messagebox.showinfo("정보", "콜라주를 생성하는 중입니다.")
+            return
         if not self.image_paths:
             messagebox.showwarning("경고", "이미지를 하나 이상 선택하세요.")
             return
@@ -131,54 +209,330 @@ class MainWindow:
         w = max(200, int(self.canvas_w.get()))
         h = max(200, int(self.canvas_h.get()))
 
+        scale = min(1.0, max(0.05, float(self.draft_scale.get())))
+        image_paths = list(self.image_paths)
+
+        # 레시피를 만들고 초안 배율로 렌더링
+        # 초안은 바로 편집할 수 있도록 레이어 스택으로, 원래 크기는 패치를 보관하지 않는 render_recipe로 렌더링
+        def task(progress, cancel_event):
+            recipe = self.generator.create_recipe(image_paths, (w, h), pieces)
+            if scale < 1.0:
+                return self._render_layers(recipe, scale, progress, cancel_event)
+            return self.generator.render_recipe(recipe, scale, progress, cancel_event), recipe, scale, None
+
+        self._start_worker(task)
+
+    # 마지막 초안의 레시피를 원래 크기로 렌더링
+    def _render_final(self):
+        if self._worker is not None:
+            messagebox.showinfo("정보", "콜라주를 생성하는 중입니다.")
+            return
+        if self.last_recipe is None:
+            messagebox.showinfo("정보", "먼저 콜라주를 생성하세요.")
+            return
+        if self.last_scale >= 1.0:
+            messagebox.showinfo("정보", "이미 원래 크기로 렌더링된 결과입니다.")
+            return
+
+        recipe = self.last_recipe
+
+        def task(progress, cancel_event):
+            return self.generator.render_recipe(recipe, 1.0, progress, cancel_event), recipe, 1.0, None
+
+        self._start_worker(task)
+
+    # 원래 크기 결과를 처음 편집할 때 작업 스레드에서 레이어 스택으로 다시 렌더링
+    def _prepare_editing(self):
+        recipe, scale = self.last_recipe, self.last_scale
+
+        def task(progress, cancel_event):
+            return self._render_layers(recipe, scale, progress, cancel_event)
+
+        self._start_worker(task)
+        self.progress_label.config(text="편집 준비 중...")
+
+    # 레이어 스택으로 렌더링 (작업 스레드에서 실행, 결과는 스택 캔버스의 뷰)
+    def _render_layers(self, recipe, scale, progress, cancel_event):
+        stack = LayerStack(self.generator, recipe, scale, progress, cancel_event)
+        return stack.result(), recipe, scale, stack
+
+    # 작업 스레드 시작 (결과는 이벤트 큐로 받음)
+    # task(progress, cancel_event) -> (결과 이미지, 레시피, 배율, 레이어 스택 또는 None)
+    def _start_worker(self, task):
+        self._cancel_event = threading.Event()
+        self._worker = threading.Thread(
+            target=self._generate_worker,
+            args=(task, self._cancel_event),
+            daemon=True
+        )
+        self.cancel_button.config(state="normal")
+        self.progress_label.config(text="생성 준비 중...")
+        self._worker.start()
+        self.root.after(50, self._poll_generation)
+
+    # 작업 스레드: 생성 후 결과/오류를 큐에 전달 (Tk 객체에 직접 접근하지 않음)
+    def _generate_worker(self, task, cancel_event):
         try:
-            result = self.generator.generate(
-                image_paths=self.image_paths,
-                canvas_size=(w, h),
-                pieces=pieces
+            result = task(
+                lambda done, total: self._events.put(("progress", done, total)),
+                cancel_event
             )
-            self.last_result = result
-            self._show_result_on_frame(result)
+            self._events.put(("done",) + result)
+        except GenerationCancelled:
+            self._events.put(("cancelled",))
         except Exception as e:
-            messagebox.showerror("오류", f"콜라주 생성 실패:\n{e}")
+            self._events.put(("error", e))
+
+    # UI 스레드: 작업 스레드 이벤트 처리 (root.after로 주기적 호출)
+    def _poll_generation(self):
+        finished = False
+        try:
+            while True:
+                event = self._events.get_nowait()
+                if event[0] == "progress":
+                    _, done, total = event
+                    self.progress_label.config(text=f"조각 배치 중... {done}/{total}")
+                elif event[0] == "done":
+                    finished = True
+                    self._reset_editing()
+                    _, self.last_result, self.last_recipe, self.last_scale, self.layer_stack = event
+                    if self.last_scale < 1.0:
+                        self.progress_label.config(text=f"초안 완료 (배율 {self.last_scale:g})")
+                    else:
+                        self.progress_label.config(text="완료")
+                    self._show_result_on_frame(self.last_result)
+                elif event[0] == "cancelled":
+                    finished = True
+                    self.progress_label.config(text="취소됨")
+                elif event[0] == "error":
+                    finished = True
+                    self.progress_label.config(text="실패")
+                    messagebox.showerror("오류", f"콜라주 생성 실패:\n{event[1]}")
+        except queue.Empty:
+            pass
 
+        if finished:
+            self._worker = None
+            self._cancel_event = None
+            self.cancel_button.config(state="disabled")
+        else:
+            self.root.after(50, self._poll_generation)
+
+    # 생성 취소 (다음 조각 배치 전에 중단됨)
+    def _cancel_generation(self):
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self.progress_label.config(text="취소 중...")
+
+    # 새 결과 표시 (피라미드를 새로 만들고 미리보기 갱신)
     def _show_result_on_frame(self, img_bgra):
-        h, w = img_bgra.shape[:2]
+        self.preview_pyramid = PreviewPyramid(img_bgra)
+        self._render_preview()
+
+    # 미리보기 영역 크기에 맞춰 피라미드의 가까운 단계에서 그리기
+    def _render_preview(self):
+        if self.preview_pyramid is None:
+            return
+        w, h = self.preview_pyramid.size()
         maxw = self.preview_frame.winfo_width() or 800
         maxh = self.preview_frame.winfo_height() or 600
         scale = min(maxw / w, maxh / h, 1.0)
-        
-        new_w, new_h = int(w * scale), int(h * scale)
-        resized = cv2.resize(img_bgra, (new_w, new_h), interpolation=cv2.INTER_AREA)
-        
-        rgba = cv2.cvtColor(resized, cv2.COLOR_BGRA2RGBA)
-        pil_img = Image.fromarray(rgba)
-        
-        self.tkimg = ImageTk.PhotoImage(pil_img)
-        for widget in self.preview_frame.winfo_children():
-            widget.destroy()
-        lbl = tk.Label(self.preview_frame, image=self.tkimg)
-        lbl.pack(expand=True)
+
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        pil_img = Image.fromarray(self.preview_pyramid.render(new_w, new_h))
+        self.preview_scale = new_w / w
+        self._preview_size = (maxw, maxh)
+
+        # 같은 크기면 기존 Tk 이미지에 덮어쓰기, 크기가 바뀌었을 때만 새로 생성
+        if self.tkimg is not None and (self.tkimg.width(), self.tkimg.height()) == (new_w, new_h):
+            self.tkimg.paste(pil_img)
+        else:
+            self.tkimg = ImageTk.PhotoImage(pil_img)
+
+        # 편집 중 드래그가 끊기지 않도록 미리보기 라벨은 한 번만 만들고 이미지만 교체
+        if self.preview_label is None:
+            for widget in self.preview_frame.winfo_children():
+                widget.destroy()
+            self.preview_label = tk.Label(self.preview_frame, image=self.tkimg)
+            self.preview_label.pack(expand=True)
+            self.preview_label.bind("<ButtonPress-1>", self._on_preview_press)
+            self.preview_label.bind("<B1-Motion>", self._on_preview_drag)
+            self.preview_label.bind("<ButtonRelease-1>", self._on_preview_release)
+            self.preview_label.bind("<MouseWheel>", self._on_preview_wheel)
+            self.preview_label.bind("<Button-4>", self._on_preview_wheel)
+            self.preview_label.bind("<Button-5>", self._on_preview_wheel)
+
+            # 선택된 조각 삭제 (클릭하면 미리보기에 포커스가 가므로 옵션 입력 중의 Delete는 해당 없음)
+            self.preview_label.bind("<Delete>", self._delete_selected_piece)
+        elif self.preview_label.cget("image") != str(self.tkimg):
+            self.preview_label.config(image=self.tkimg)
+
+    # 미리보기 영역 크기 변경 (연속 이벤트는 마지막 것만 처리)
+    def _on_preview_resize(self, event):
+        if self.preview_pyramid is None or self._preview_size == (event.width, event.height):
+            return
+        if self._resize_job is not None:
+            self.root.after_cancel(self._resize_job)
+        self._resize_job = self.root.after(100, self._finish_preview_resize)
+
+    def _finish_preview_resize(self):
+        self._resize_job = None
+        self._render_preview()
+
+    # 편집 상태 초기화 (새 결과가 나오면 이전 레이어는 버림)
+    def _reset_editing(self):
+        self.layer_stack = None
+        self._selected_piece = None
+        self._drag_from = None
+
+    # 미리보기 이벤트 좌표 -> 결과 이미지 좌표
+    def _preview_to_canvas(self, event):
+        lbl = event.widget
+        ox = (lbl.winfo_width() - self.tkimg.width()) // 2
+        oy = (lbl.winfo_height() - self.tkimg.height()) // 2
+        return (event.x - ox) / self.preview_scale, (event.y - oy) / self.preview_scale
+
+    # 편집 가능 여부 (레이어 스택은 작업 스레드가 렌더링하면서 만들어 둠, 생성 중이면 편집 불가)
+    def _can_edit(self):
+        return self._worker is None and self.layer_stack is not None
+
+    # 클릭한 위치의 조각 선택 (레이어 스택이 없는 결과는 먼저 편집 준비)
+    def _on_preview_press(self, event):
+        if self._worker is None and self.layer_stack is None and self.last_recipe is not None:
+            self._prepare_editing()
+            return
+        if not self._can_edit():
+            return
+        event.widget.focus_set()
+        x, y = self._preview_to_canvas(event)
+        self._selected_piece = self.layer_stack.hit_test(x, y)
+        self._drag_from = (x, y) if self._selected_piece is not None else None
+        if self._selected_piece is None:
+            self.layer_stack.end_edit()
+            self.progress_label.config(text="")
+        else:
+            self.progress_label.config(text=f"조각 {self._selected_piece + 1} 선택 (휠: 회전, Delete: 삭제)")
+
+    # 선택된 조각 드래그 이동
+    def _on_preview_drag(self, event):
+        if self._drag_from is None or not self._can_edit():
+            return
+        x, y = self._preview_to_canvas(event)
+        dx, dy = x - self._drag_from[0], y - self._drag_from[1]
+        if abs(dx) < 1 and abs(dy) < 1:
+            return
+        rects = self.layer_stack.move(self._selected_piece, dx, dy)
+        self._drag_from = (x, y)
+        self._apply_edit(rects)
+
+    def _on_preview_release(self, event):
+        self._drag_from = None
+
+    # 마우스 휠로 선택된 조각 회전 (한 칸에 5도)
+    def _on_preview_wheel(self, event):
+        if self._selected_piece is None or not self._can_edit():
+            return
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        rects = self.layer_stack.rotate(self._selected_piece, 5 if up else -5)
+        self._apply_edit(rects)
+
+    # 선택된 조각 삭제
+    def _delete_selected_piece(self, event=None):
+        if self._selected_piece is None or not self._can_edit():
+            return
+        rects = self.layer_stack.delete(self._selected_piece)
+        self._selected_piece = None
+        self._drag_from = None
+        self.progress_label.config(text="조각 삭제됨")
+        self._apply_edit(rects)
+
+    # 편집 결과를 마지막 결과/레시피에 반영하고 바뀐 영역만 피라미드 갱신 후 미리보기 갱신
+    def _apply_edit(self, rects):
+        self.last_recipe = self.layer_stack.to_recipe()
+        for rect in rects:
+            self.preview_pyramid.update(rect)
+        self._render_preview()
 
     def _save_result(self):
-        if self.last_result is None:
-            messagebox.showinfo("정보", "저장할 결과가 없습니다. 먼저 콜라주를 생성하세요.")
+        if not self._check_saveable():
             return
         path = filedialog.asksaveasfilename(
             title="결과 저장 (PNG 권장)",
             defaultextension=".png",
-            filetypes=[("PNG", "*.png"), ("JPG", "*.jpg")]
+            filetypes=[("PNG", "*.png"), ("JPG", "*.jpg"), ("WebP", "*.webp")]
         )
         if not path:
             return
-        
-        if path.lower().endswith(".jpg") or path.lower().endswith(".jpeg"):
-            bgr = cv2.cvtColor(self.last_result, cv2.COLOR_BGRA2BGR)
-            cv2.imwrite(path, bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        else:
-            cv2.imwrite(path, self.last_result)
-        
-        messagebox.showinfo("저장완료", f"저장됨: {path}")
+
+        self._start_export([path], None, path)
+
+    # PNG/JPG/WebP와 썸네일을 한 번에 저장 (선택한 이름에 확장자만 바꿈)
+    def _export_all(self):
+        if not self._check_saveable():
+            return
+        path = filedialog.asksaveasfilename(title="내보낼 파일 이름", defaultextension=".png",
+                                            filetypes=[("PNG", "*.png")])
+        if not path:
+            return
+
+        base = os.path.splitext(path)[0]
+        outputs = [base + ".png", base + ".jpg", base + ".webp"]
+        self._start_export(outputs, (base + "_thumb.jpg", 256), base + ".*")
+
+    # 저장할 결과가 있는지 확인
+    def _check_saveable(self):
+        if self.last_result is None:
+            messagebox.showinfo("정보", "저장할 결과가 없습니다. 먼저 콜라주를 생성하세요.")
+            return False
+        if self.last_scale < 1.0:
+            messagebox.showinfo("정보", "초안 결과입니다. '최종 렌더링' 후 저장하세요.")
+            return False
+        return True
+
+    # 백그라운드 저장 시작 (결과를 복사해 두므로 저장 중에도 편집 가능)
+    def _start_export(self, outputs, thumbnail, name):
+        try:
+            future = self.exporter.submit(self.last_result, outputs, thumbnail)
+        except Exception as e:
+            messagebox.showerror("오류", f"저장 실패:\n{e}")
+            return
+
+        self._exports.append((future, name))
+        self.progress_label.config(text="저장 중...")
+        if len(self._exports) == 1:
+            self.root.after(100, self._poll_exports)
+
+    # UI 스레드: 끝난 저장 작업 결과 표시 (root.after로 주기적 호출)
+    def _poll_exports(self):
+        pending = []
+        for future, name in self._exports:
+            if not future.done():
+                pending.append((future, name))
+                continue
+
+            try:
+                report = future.result()
+            except Exception as e:
+                self.progress_label.config(text="저장 실패")
+                messagebox.showerror("오류", f"저장 실패:\n{e}")
+                continue
+
+            self.progress_label.config(text=f"저장 완료 ({report['seconds']:.1f}초)")
+            lines = [f"{os.path.basename(o['path'])}: {o['bytes'] / 1024:,.0f} KB, {o['seconds']:.2f}초"
+                     for o in report["outputs"]]
+            messagebox.showinfo("저장완료", f"저장됨: {name}\n" + "\n".join(lines))
+
+        self._exports = pending
+        if pending:
+            self.root.after(100, self._poll_exports)
+
+    # 진행 중인 저장을 마친 뒤 종료
+    def _quit(self):
+        if self._exports:
+            self.progress_label.config(text="저장 마무리 중...")
+            self.root.update_idletasks()
+        self.exporter.shutdown(wait=True)
+        self.root.destroy()
 
     def run(self):
         self.root.mainloop()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import sys
+import argparse
+from engine.collage_service import CollageService
+from cli_options import parse_size, parse_option
+
+
+# 명령행 인자 파싱
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="상주 콜라주 생성 서비스 (HTTP, POST /collage)")
+    parser.add_argument("--host", default="127.0.0.1", help="바인드 주소 (기본값: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="포트 (기본값: 8765)")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="동시에 렌더링하는 생성기 수")
+    parser.add_argument("--queue", type=int, default=8, help="대기열 길이 (넘으면 503 응답)")
+    parser.add_argument("--root", help="소스 이미지 폴더 (지정하면 요청 경로는 이 폴더 기준이며 밖은 거절)")
+    parser.add_argument("--timeout", type=float, default=120, help="요청 하나의 최대 처리 시간 (초)")
+    parser.add_argument("--max-canvas", type=int, default=8000, help="요청 캔버스 한 변의 최대 크기 (픽셀)")
+    parser.add_argument("--max-pieces", type=int, default=2000, help="요청 하나의 최대 조각 수")
+    parser.add_argument("--warm", nargs="+", default=[], metavar="IMAGE",
+                        help="시작할 때 미리 디코딩해 둘 소스 이미지")
+    parser.add_argument("--warm-size", type=parse_size, nargs="+", default=[(1000, 700)], metavar="WxH",
+                        help="미리 디코딩할 때 기준이 되는 요청 캔버스 크기 목록 (기본값: 1000x700)")
+    parser.add_argument("--warm-scale", type=float, default=1.0, help="미리 디코딩할 때 기준이 되는 요청 배율")
+    parser.add_argument("--set", type=parse_option, action="append", default=[], dest="options",
+                        metavar="KEY=VALUE", help="CollageGenerator 생성 인자 (예: --set placement=grid)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = CollageService(workers=args.workers, queue_size=args.queue, generator_options=dict(args.options),
+                             source_root=args.root, request_timeout=args.timeout,
+                             max_canvas_side=args.max_canvas, max_pieces=args.max_pieces)
+
+    if args.warm:
+        print(f"소스 {len(args.warm)}개 미리 읽는 중...", flush=True)
+        service.warm(args.warm, args.warm_size, args.warm_scale)
+
+    print(f"http://{args.host}:{args.port} 에서 대기 중 (Ctrl+C로 종료)", flush=True)
+    try:
+        service.serve(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())